@@ -1,12 +1,53 @@
 import models
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.models import User
+from blogengine.pagination import EstimatedCountPaginator, EstimatedCountQuerySet
+from blogengine.search import match_posts
+from blogengine.slugs import allocate_slug
 # Register your models here.
 
 
+class PostAdminForm(forms.ModelForm):
+    class Meta:
+        model = models.Post
+        fields = '__all__'
+
+    def clean_slug(self):
+        # The slug prepopulated from the title may belong to another post;
+        # suffix it instead of failing the unique check.
+        return allocate_slug(self.instance, self.cleaned_data['slug'])
+
+
+class PostChangeList(ChangeList):
+    def get_results(self, request):
+        # Filtered or searched results show the unfiltered total as well,
+        # which ChangeList would COUNT(*) over the whole table.
+        self.root_queryset = self.root_queryset._clone(klass=EstimatedCountQuerySet)
+        super(PostChangeList, self).get_results(request)
+
+
 class PostAdmin(admin.ModelAdmin):
+    form = PostAdminForm
     prepopulated_fields = {"slug": ("title",)}
     exclude = ('author',)
+    list_display = ('title', 'pub_date', 'category', 'author', 'site')
+    list_select_related = ('category', 'author', 'site')
+    # Drilled down through the (pub_date, id) index, with the years and
+    # months listed from MonthArchive, see admin/blogengine/post/change_list.html.
+    date_hierarchy = 'pub_date'
+    # Only shows the search box, get_search_results() uses the search index.
+    search_fields = ('title',)
+    paginator = EstimatedCountPaginator
+
+    def get_changelist(self, request, **kwargs):
+        return PostChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return match_posts(queryset, search_term), False
 
     def save_model(self, request, obj, form, change):
         obj.author = request.user
@@ -0,0 +1,119 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.utils import timezone
+
+from blogengine.counts import recount_categories, recount_months, recount_tags
+from blogengine.models import Category, Post, Tag
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod '
+         'tempor incididunt ut labore et dolore magna aliqua django python '
+         'postgres cache query index template markdown feed').split()
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """
+    Runs the enclosed block against a freshly migrated throwaway copy of
+    the default database, so seeding never touches real data.
+    """
+    if 'south' in settings.INSTALLED_APPS:
+        from south.management.commands import patch_for_test_db_setup
+        patch_for_test_db_setup()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _markdown(rng):
+    # Headings, lists, links, emphasis and code, like the real posts.
+    blocks = ['## ' + _sentence(rng, 5)[:-1]]
+    for _ in range(rng.randint(2, 5)):
+        kind = rng.randint(0, 3)
+        if kind == 0:
+            blocks.append('\n'.join('* ' + _sentence(rng, 6) for _ in range(rng.randint(2, 5))))
+        elif kind == 1:
+            blocks.append('\n'.join('    ' + ' = '.join(rng.sample(WORDS, 2)) for _ in range(rng.randint(2, 6))))
+        else:
+            words = _sentence(rng, 50).split()
+            words[rng.randint(0, 10)] = '*%s*' % rng.choice(WORDS)
+            words[rng.randint(11, 20)] = '**%s**' % rng.choice(WORDS)
+            words[rng.randint(21, 30)] = '[%s](http://example.com/%s)' % (rng.choice(WORDS), rng.choice(WORDS))
+            words[rng.randint(31, 40)] = '`%s()`' % rng.choice(WORDS)
+            blocks.append(' '.join(words))
+    return '\n\n'.join(blocks)
+
+
+def seed_corpus(posts=1000, categories=20, tags=100, tags_per_post=3,
+                batch_size=1000, seed=0, markdown=False, flatpages=0):
+    """
+    Bulk inserts a synthetic corpus of posts spread over ten years, each
+    with a category and ``tags_per_post`` tags. With ``markdown`` the posts
+    are realistic Markdown rendered like a saved post, which is slower.
+    """
+    rng = random.Random(seed)
+    author, _ = User.objects.get_or_create(username='benchmark')
+    site = Site.objects.get_current()
+    now = timezone.now()
+
+    Category.objects.bulk_create([
+        Category(name='Category %d' % i, description=_sentence(rng), slug='bench-category-%d' % i)
+        for i in range(categories)])
+    Tag.objects.bulk_create([
+        Tag(name='Tag %d' % i, description=_sentence(rng), slug='bench-tag-%d' % i)
+        for i in range(tags)])
+    category_ids = list(Category.objects.filter(slug__startswith='bench-category-')
+                        .values_list('pk', flat=True))
+    tag_ids = list(Tag.objects.filter(slug__startswith='bench-tag-').values_list('pk', flat=True))
+
+    Through = Post.tags.through
+    for start in range(0, posts, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, posts)):
+            if markdown:
+                text = _markdown(rng)
+            else:
+                text = '\n\n'.join(_sentence(rng, 40) for _ in range(rng.randint(2, 6)))
+            batch.append(Post(
+                title=_sentence(rng, 6),
+                text=text,
+                slug='bench-post-%d' % i,
+                pub_date=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 10)),
+                author=author,
+                site=site,
+                category_id=rng.choice(category_ids),
+            ))
+        if markdown:
+            for post in batch:
+                post.render()
+        Post.objects.bulk_create(batch)
+        # bulk_create does not return primary keys, so look them up by slug
+        # to link the tags.
+        post_ids = Post.objects.filter(slug__in=[post.slug for post in batch]).values_list('pk', flat=True)
+        Through.objects.bulk_create([
+            Through(post_id=post_id, tag_id=tag_id)
+            for post_id in post_ids
+            for tag_id in rng.sample(tag_ids, min(tags_per_post, len(tag_ids)))])
+
+    for i in range(flatpages):
+        page = FlatPage.objects.create(url='/bench-page-%d/' % i, title='Page %d' % i,
+                                       content=_markdown(rng))
+        page.sites.add(site)
+
+    # bulk_create skips the signals that keep the counts.
+    recount_categories()
+    recount_tags()
+    recount_months()
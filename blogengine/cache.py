@@ -0,0 +1,158 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, get_cache
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.decorators import available_attrs
+
+FEED_CACHE_KEY = 'blogengine.feed.posts'
+TAG_CLOUD_CACHE_KEY = 'blogengine.sidebar.tags'
+CATEGORY_LIST_CACHE_KEY = 'blogengine.sidebar.categories'
+MONTH_LIST_CACHE_KEY = 'blogengine.sidebar.months'
+
+# The {% cache %} fragments of the page chrome in the templates.
+NAV_FRAGMENT = 'blog_nav'
+SIDEBAR_FRAGMENT = 'blog_sidebar'
+
+# Every cached page belongs to one or more groups, and its key embeds the
+# current version of those groups and of SITE_GROUP. Bumping a version
+# orphans the group's pages at once, whatever paths or query strings they
+# had. Pages showing the sidebar also belong to SIDEBAR_GROUP.
+SITE_GROUP = 'site'
+SIDEBAR_GROUP = 'sidebar'
+INDEX_GROUP = 'index'
+ARCHIVE_GROUP = 'archive'
+POST_GROUP = 'post:%(slug)s'
+CATEGORY_GROUP = 'category:%(slug)s'
+TAG_GROUP = 'tag:%(slug)s'
+FLATPAGE_GROUP = 'flatpages'
+SITEMAP_INDEX_GROUP = 'sitemap'
+SITEMAP_GROUP = 'sitemap:%(section)s:%(shard)s'
+
+
+def get_feed_response():
+    return cache.get(FEED_CACHE_KEY)
+
+
+def set_feed_response(response):
+    cache.set(FEED_CACHE_KEY, response, getattr(settings, 'BLOG_FEED_CACHE_TIMEOUT', 300))
+
+
+def invalidate_feed():
+    cache.delete(FEED_CACHE_KEY)
+
+
+def chrome_cache_timeout():
+    # Saves purge the chrome only from the saving process's cache when it
+    # is per process, so this bounds how long the others show it stale.
+    return getattr(settings, 'BLOG_CHROME_CACHE_TIMEOUT', 60)
+
+
+def get_sidebar(key, build):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, chrome_cache_timeout())
+    return value
+
+
+def invalidate_sidebar():
+    cache.delete_many([TAG_CLOUD_CACHE_KEY, CATEGORY_LIST_CACHE_KEY, MONTH_LIST_CACHE_KEY,
+                       make_template_fragment_key(SIDEBAR_FRAGMENT)])
+    invalidate_pages(SIDEBAR_GROUP)
+
+
+def invalidate_nav():
+    cache.delete(make_template_fragment_key(NAV_FRAGMENT))
+
+
+def post_group(slug):
+    return POST_GROUP % {'slug': slug}
+
+
+def category_group(slug):
+    return CATEGORY_GROUP % {'slug': slug}
+
+
+def tag_group(slug):
+    return TAG_GROUP % {'slug': slug}
+
+
+def sitemap_group(section, shard):
+    return SITEMAP_GROUP % {'section': section, 'shard': shard}
+
+
+def get_page_cache():
+    return get_cache(getattr(settings, 'BLOG_PAGE_CACHE_ALIAS', 'default'))
+
+
+def _version_key(group):
+    return 'blogengine.group.%s' % group
+
+
+def _new_version():
+    # Versions start from the clock so that a group whose version was
+    # evicted never comes back with a number used before.
+    return int(time.time() * 1000)
+
+
+def group_versions(page_cache, groups):
+    keys = [_version_key(group) for group in groups]
+    versions = page_cache.get_many(keys)
+    missing = dict((key, _new_version()) for key in keys if key not in versions)
+    if missing:
+        page_cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate_pages(*groups):
+    page_cache = get_page_cache()
+    for group in set(groups):
+        try:
+            page_cache.incr(_version_key(group))
+        except ValueError:
+            page_cache.set(_version_key(group), _new_version(), None)
+
+
+def page_key(page_cache, groups, request):
+    groups = [SITE_GROUP] + list(groups)
+    versions = group_versions(page_cache, groups)
+    path = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+    return 'blogengine.page.%s.%s' % (
+        '.'.join('%s-%s' % pair for pair in zip(groups, versions)), path)
+
+
+def cache_page_group(*groups):
+    """
+    Caches the whole response of a view for anonymous GET and HEAD
+    requests. ``groups`` name the groups the page is invalidated with and
+    are interpolated with the view's keyword arguments, e.g. POST_GROUP.
+    """
+    def decorator(view_func):
+        @wraps(view_func, assigned=available_attrs(view_func))
+        def _wrapped_view(request, *args, **kwargs):
+            if (not getattr(settings, 'BLOG_PAGE_CACHE', False)
+                    or request.method not in ('GET', 'HEAD')
+                    or settings.SESSION_COOKIE_NAME in request.COOKIES):
+                return view_func(request, *args, **kwargs)
+
+            page_cache = get_page_cache()
+            key = page_key(page_cache, [group % kwargs for group in groups], request)
+            response = page_cache.get(key)
+            if response is not None:
+                return response
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                timeout = getattr(settings, 'BLOG_PAGE_CACHE_TIMEOUT', 600)
+                if hasattr(response, 'render') and callable(response.render):
+                    response.add_post_render_callback(
+                        lambda r: page_cache.set(key, r, timeout))
+                else:
+                    page_cache.set(key, response, timeout)
+            return response
+        return _wrapped_view
+    return decorator
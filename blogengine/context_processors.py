@@ -0,0 +1,18 @@
+import time
+
+from django.conf import settings
+
+from blogengine.cache import chrome_cache_timeout
+
+STARTED = str(int(time.time()))
+
+
+def static_version(request):
+    # The cached static file links of base.html vary on it, so a deploy
+    # with new static files does not keep serving the old links.
+    return {'static_version': getattr(settings, 'BLOG_STATIC_VERSION', None) or STARTED}
+
+
+def chrome_cache(request):
+    # The timeout of the navigation and sidebar fragments of the templates.
+    return {'chrome_cache_timeout': chrome_cache_timeout()}
@@ -0,0 +1,86 @@
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from blogengine.cache import invalidate_sidebar
+
+
+def _recount(table, count_sql, ids):
+    # A correlated subquery recounts any number of rows in one statement,
+    # and stays right however often a relation was added or removed.
+    sql = "UPDATE %s SET post_count = (%s)" % (table, count_sql)
+    params = []
+    if ids is not None:
+        ids = [pk for pk in set(ids) if pk is not None]
+        if not ids:
+            return
+        sql += " WHERE id IN (%s)" % ", ".join(["%s"] * len(ids))
+        params = ids
+    connection.cursor().execute(sql, params)
+    invalidate_sidebar()
+
+
+def recount_categories(ids=None):
+    """
+    Recounts the posts of the given categories, or of all of them.
+    """
+    table = Category._meta.db_table
+    _recount(table, "SELECT COUNT(*) FROM %s WHERE category_id = %s.id"
+             % (Post._meta.db_table, table), ids)
+
+
+def recount_tags(ids=None):
+    """
+    Recounts the posts of the given tags, or of all of them.
+    """
+    table = Tag._meta.db_table
+    _recount(table, "SELECT COUNT(*) FROM %s WHERE tag_id = %s.id"
+             % (Post.tags.through._meta.db_table, table), ids)
+
+
+def month_of(value):
+    """
+    Returns the (year, month) a post published at ``value`` is archived
+    under, in the current time zone like the archive views.
+    """
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.year, value.month
+
+
+def archive_datetime(year, month, day=1):
+    value = datetime.datetime(year, month, day)
+    if settings.USE_TZ:
+        value = timezone.make_aware(value, timezone.get_current_timezone())
+    return value
+
+
+def month_range(year, month):
+    return archive_datetime(year, month), archive_datetime(year + month // 12, month % 12 + 1)
+
+
+def recount_months(months=None):
+    """
+    Recounts the posts of the given (year, month) pairs, or rebuilds the
+    whole month archive.
+    """
+    if months is None:
+        MonthArchive.objects.all().delete()
+        months = [month_of(value) for value in Post.objects.datetimes('pub_date', 'month')]
+    for year, month in set(months):
+        since, until = month_range(year, month)
+        count = Post.objects.filter(pub_date__gte=since, pub_date__lt=until).count()
+        if count:
+            updated = MonthArchive.objects.filter(year=year, month=month).update(post_count=count)
+            if not updated:
+                MonthArchive.objects.create(year=year, month=month, post_count=count)
+        else:
+            MonthArchive.objects.filter(year=year, month=month).delete()
+    invalidate_sidebar()
+
+
+# Imported last: the models connect blogengine.signals, which uses the
+# functions above.
+from blogengine.models import Category, MonthArchive, Post, Tag
@@ -0,0 +1,49 @@
+"""
+The postgresql_psycopg2 backend with connections taken from a process
+local pool. Use it with CONN_MAX_AGE = 0, so every request hands its
+connection back, and configure the pool with a POOL dict in the database
+settings: MAX_SIZE, MAX_IDLE, MAX_LIFETIME, HEALTH_CHECK_INTERVAL and
+TIMEOUT, see blogengine.db.pool.ConnectionPool.
+"""
+from django.db.backends.postgresql_psycopg2.base import Database
+from django.db.backends.postgresql_psycopg2.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from blogengine.db.pool import PoolExhausted, get_pool
+
+
+def is_alive(connection):
+    if connection.closed:
+        return False
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    def get_pool(self, conn_params):
+        options = dict((key.lower(), value) for key, value in
+                       self.settings_dict.get('POOL', {}).items())
+        options.setdefault('check', is_alive)
+        # Keyed by the server and database too: creating the test
+        # database switches NAME on the same alias.
+        name = '%s:%s@%s/%s' % (self.alias, conn_params.get('user', ''),
+                                conn_params.get('host', ''), conn_params['database'])
+        return get_pool(name, lambda: Database.connect(**conn_params), options)
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.get_pool(conn_params).acquire()
+        except PoolExhausted as e:
+            raise Database.OperationalError(str(e))
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # Connections that saw errors are not trusted again.
+                self.get_pool(self.get_connection_params()).release(
+                    self.connection, discard=self.errors_occurred)
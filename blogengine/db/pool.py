@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class ConnectionPool(object):
+    """
+    A process local pool of DB-API connections made by ``connect``.
+
+    Connections idle for more than ``health_check_interval`` seconds are
+    checked with ``check`` before they are handed out, and connections
+    older than ``max_lifetime`` seconds are closed instead of reused. At
+    most ``max_size`` connections are open at once and ``max_idle`` of
+    them kept; acquire() waits up to ``timeout`` seconds for one.
+    """
+
+    def __init__(self, connect, max_size=10, max_idle=5, max_lifetime=3600,
+                 health_check_interval=30, timeout=5, check=None, clock=time.time):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.check = check
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Idle connections as (connection, created, last used), the most
+        # recently used last.
+        self._idle = []
+        self._created = {}
+        self._connecting = 0
+        self._counters = dict.fromkeys(
+            ('connects', 'checkouts', 'reuses', 'recycled', 'health_check_failures',
+             'discarded', 'waits', 'timeouts'), 0)
+
+    def _check_fork(self):
+        # A forked child must not share its parent's sockets. It forgets
+        # them without closing, which would end the parent's sessions.
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _close(self, connection):
+        self._created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        with self._condition:
+            self._check_fork()
+            deadline = None
+            while True:
+                connection = self._take_idle()
+                if connection is not None:
+                    self._counters['reuses'] += 1
+                    break
+                if len(self._created) + self._connecting < self.max_size:
+                    # Hold the slot but not the lock while connecting.
+                    self._connecting += 1
+                    self._condition.release()
+                    try:
+                        connection = self.connect()
+                    finally:
+                        self._condition.acquire()
+                        self._connecting -= 1
+                    self._created[id(connection)] = self.clock()
+                    self._counters['connects'] += 1
+                    break
+                if deadline is None:
+                    deadline = time.time() + self.timeout
+                    self._counters['waits'] += 1
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolExhausted("All %d database connections are in use." % self.max_size)
+                self._condition.wait(remaining)
+            self._counters['checkouts'] += 1
+            return connection
+
+    def _take_idle(self):
+        now = self.clock()
+        while self._idle:
+            connection, created, last_used = self._idle.pop()
+            if self.max_lifetime is not None and now - created >= self.max_lifetime:
+                self._counters['recycled'] += 1
+                self._close(connection)
+                continue
+            if (self.check is not None and self.health_check_interval is not None
+                    and now - last_used >= self.health_check_interval
+                    and not self.check(connection)):
+                self._counters['health_check_failures'] += 1
+                self._close(connection)
+                continue
+            return connection
+        return None
+
+    def release(self, connection, discard=False):
+        """
+        Returns ``connection`` to the pool, or closes it when ``discard``
+        is set, it is too old or enough connections are idle.
+        """
+        with self._condition:
+            self._check_fork()
+            created = self._created.get(id(connection))
+            if created is None:
+                # Handed out before a fork, or never ours.
+                return
+            if not discard:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+            now = self.clock()
+            if (discard or len(self._idle) >= self.max_idle
+                    or (self.max_lifetime is not None and now - created >= self.max_lifetime)):
+                self._counters['discarded'] += 1
+                self._close(connection)
+            else:
+                self._idle.append((connection, created, now))
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            self._check_fork()
+            stats = dict(self._counters)
+            stats.update({
+                'open': len(self._created),
+                'idle': len(self._idle),
+                'in_use': len(self._created) - len(self._idle),
+                'max_size': self.max_size,
+            })
+            return stats
+
+
+# The pools of this process, by name.
+pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(name, connect, options):
+    with _pools_lock:
+        if name not in pools:
+            pools[name] = ConnectionPool(connect, **options)
+        return pools[name]
+
+
+def pool_stats():
+    return dict((name, pool.stats()) for name, pool in pools.items())
@@ -0,0 +1,63 @@
+from django.utils import six
+from django.utils.feedgenerator import Rss201rev2Feed
+from django.utils.xmlutils import SimplerXMLGenerator
+
+
+class StreamingRss201rev2Feed(Rss201rev2Feed):
+    """
+    An RSS feed whose items come from ``item_source``, an iterable of
+    add_item() keyword arguments consumed while the XML is written, so
+    only one item is held in memory at a time. Without the items up
+    front, the newest pub_date must be passed as ``latest_post_date``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.item_source = kwargs.pop('item_source', ())
+        self.latest = kwargs.pop('latest_post_date', None)
+        super(StreamingRss201rev2Feed, self).__init__(*args, **kwargs)
+
+    def latest_post_date(self):
+        return self.latest or super(StreamingRss201rev2Feed, self).latest_post_date()
+
+    def write_item(self, handler, item):
+        handler.startElement('item', self.item_attributes(item))
+        self.add_item_elements(handler, item)
+        handler.endElement('item')
+
+    def iter_items(self):
+        for item in self.items:
+            yield item
+        for kwargs in self.item_source:
+            # add_item() fills in the defaults of the item dictionary.
+            self.add_item(**kwargs)
+            yield self.items.pop()
+
+    def write_items(self, handler):
+        for item in self.iter_items():
+            self.write_item(handler, item)
+
+    def stream(self, encoding):
+        """
+        Yields the encoded XML in chunks: the channel elements, then one
+        chunk per item.
+        """
+        out = six.StringIO()
+
+        def flush():
+            chunk = out.getvalue()
+            out.seek(0)
+            out.truncate()
+            return chunk
+
+        handler = SimplerXMLGenerator(out, encoding)
+        handler.startDocument()
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+        yield flush()
+        for item in self.iter_items():
+            self.write_item(handler, item)
+            yield flush()
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+        yield flush()
@@ -0,0 +1,248 @@
+import calendar
+import codecs
+import hashlib
+import os
+import re
+from datetime import datetime
+
+import feedparser
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.html import strip_tags
+from django.utils.six.moves import html_parser
+
+from blogengine.cache import SITE_GROUP, invalidate_feed, invalidate_pages
+from blogengine.counts import recount_categories, recount_months, recount_tags
+from blogengine.markup import markdown_digest, render_markdown
+from blogengine.models import Category, Post, Tag
+from blogengine.search import index_posts
+from blogengine.slugs import allocate_slugs
+from blogengine.stamps import CHROME_STAMP, POSTS_STAMP, touch_stamps
+
+MARKDOWN_EXTENSIONS = ('.md', '.markdown')
+
+BLOCK_END_RE = re.compile(r'(?i)<br\s*/?>|</(p|div|h[1-6]|li|pre|blockquote)>')
+
+
+def html_to_text(html):
+    # Post text is Markdown rendered in safe mode, which drops raw HTML,
+    # so keep the words and paragraphs of HTML feed entries.
+    text = strip_tags(BLOCK_END_RE.sub('\n\n', html))
+    text = html_parser.HTMLParser().unescape(text)
+    return re.sub(r'\n\s*\n\s*', '\n\n', text).strip()
+
+
+def parse_front_matter(content):
+    """
+    Splits a Markdown file into its front matter, ``key: value`` lines
+    between two ``---`` lines, and the text that follows.
+    """
+    lines = content.splitlines()
+    if not lines or lines[0].strip() != '---':
+        return {}, content
+    meta = {}
+    for i, line in enumerate(lines[1:], 1):
+        if line.strip() == '---':
+            return meta, '\n'.join(lines[i + 1:]).strip()
+        key, sep, value = line.partition(':')
+        if sep:
+            meta[key.strip().lower()] = value.strip().strip('"\'')
+    return {}, content
+
+
+def split_list(value):
+    return [name.strip().strip('"\'') for name in value.strip('[]').split(',') if name.strip()]
+
+
+def parse_pub_date(value):
+    value = value.strip()
+    pub_date = parse_datetime(value)
+    if pub_date is None:
+        day = parse_date(value)
+        if day is None:
+            return None
+        pub_date = datetime(day.year, day.month, day.day)
+    if settings.USE_TZ and timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date, timezone.get_current_timezone())
+    return pub_date
+
+
+def import_key(source):
+    # A stable name for the source of a post, the same on every run.
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+def mtime_pub_date(path):
+    pub_date = datetime.utcfromtimestamp(os.path.getmtime(path))
+    return timezone.make_aware(pub_date, timezone.utc) if settings.USE_TZ else pub_date
+
+
+def read_markdown_file(path, name):
+    """
+    Reads the Markdown file at ``path``, known as ``name`` relative to the
+    directory being imported.
+    """
+    with codecs.open(path, encoding='utf-8') as f:
+        meta, text = parse_front_matter(f.read())
+    return {
+        'key': import_key(u'file:%s' % name.replace(os.sep, '/')),
+        'title': meta.get('title') or os.path.splitext(os.path.basename(path))[0].replace('-', ' '),
+        'slug': meta.get('slug'),
+        'pub_date': parse_pub_date(meta.get('date', '')) or mtime_pub_date(path),
+        'text': text,
+        'category': meta.get('category'),
+        'tags': split_list(meta.get('tags', '')),
+    }
+
+
+def iter_markdown(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(MARKDOWN_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield read_markdown_file(path, os.path.relpath(path, directory))
+
+
+def iter_feed(path):
+    feed = feedparser.parse(path)
+    for entry in feed.entries:
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        if parsed:
+            pub_date = datetime.utcfromtimestamp(calendar.timegm(parsed))
+            if settings.USE_TZ:
+                pub_date = timezone.make_aware(pub_date, timezone.utc)
+        else:
+            pub_date = timezone.now()
+        content = entry.get('content')
+        if content:
+            text, content_type = content[0].value, content[0].type
+        else:
+            text, content_type = entry.get('summary', ''), entry.get('summary_detail', {}).get('type')
+        if content_type in ('text/html', 'application/xhtml+xml'):
+            text = html_to_text(text)
+        source = entry.get('id') or entry.get('link') or u'%s %s' % (
+            entry.get('title', ''), entry.get('published', entry.get('updated', '')))
+        yield {
+            'key': import_key(u'feed:%s' % source),
+            'title': entry.get('title', ''),
+            'slug': None,
+            'pub_date': pub_date,
+            'text': text,
+            'category': None,
+            'tags': [tag.term for tag in entry.get('tags', []) if tag.get('term')],
+        }
+
+
+def iter_sources(paths):
+    """
+    Yields the posts of every feed file and Markdown directory in
+    ``paths``, one at a time.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            records = iter_markdown(path)
+        elif path.lower().endswith(MARKDOWN_EXTENSIONS):
+            records = iter([read_markdown_file(path, os.path.basename(path))])
+        else:
+            records = iter_feed(path)
+        for record in records:
+            yield record
+
+
+class PostImporter(object):
+    """
+    Writes posts in batches: their categories and tags are looked up or
+    bulk created by name, the Markdown is rendered with ``render_many``,
+    e.g. a process pool's map(), and posts and tag links are bulk
+    inserted. Bulk inserts skip the model signals, so call finish() at
+    the end to recount and purge the caches.
+    """
+
+    def __init__(self, author, site, render_many=map, default_category=None):
+        self.author = author
+        self.site = site
+        self.render_many = render_many
+        self.default_category = default_category
+        self.categories = {}
+        self.tags = {}
+        self.imported = self.skipped = 0
+
+    def taxonomy_ids(self, model, known, names):
+        wanted = set(name for name in names if name and name not in known)
+        if wanted:
+            known.update(model.objects.filter(name__in=wanted).values_list('name', 'pk'))
+            missing = sorted(wanted - set(known))
+            if missing:
+                slugs = allocate_slugs(model, missing)
+                model.objects.bulk_create([
+                    model(name=name, slug=slug, description='')
+                    for name, slug in zip(missing, slugs)])
+                known.update(model.objects.filter(slug__in=slugs).values_list('name', 'pk'))
+        return known
+
+    def import_batch(self, records):
+        # Posts imported by an earlier run carry its import key. Those
+        # imported before keys were recorded are known by their slug, if
+        # their source gave one.
+        keys = set(Post.objects.filter(import_key__in=[record['key'] for record in records])
+                   .values_list('import_key', flat=True))
+        given = [record['slug'] for record in records if record['slug']]
+        taken = set(Post.objects.filter(slug__in=given).values_list('slug', flat=True))
+        fresh = []
+        for record in records:
+            if record['key'] not in keys and record['slug'] not in taken:
+                keys.add(record['key'])
+                fresh.append(record)
+        self.skipped += len(records) - len(fresh)
+        records = fresh
+        if not records:
+            return
+
+        for record in records:
+            record['category'] = record['category'] or self.default_category
+        categories = self.taxonomy_ids(Category, self.categories, [r['category'] for r in records])
+        tags = self.taxonomy_ids(Tag, self.tags, [name for r in records for name in r['tags']])
+
+        slugs = allocate_slugs(Post, [record['slug'] or record['title'] for record in records])
+        rendered = self.render_many(render_markdown, [record['text'] for record in records])
+        posts = [
+            Post(title=record['title'][:200], text=record['text'], slug=slug, pub_date=record['pub_date'],
+                 author=self.author, site=self.site, category_id=categories.get(record['category']),
+                 rendered_text=html, text_hash=markdown_digest(record['text']),
+                 import_key=record['key'])
+            for record, slug, html in zip(records, slugs, rendered)]
+
+        with transaction.atomic():
+            Post.objects.bulk_create(posts)
+            # bulk_create does not set primary keys, so look them up by slug.
+            ids = dict(Post.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+            for post in posts:
+                post.pk = ids[post.slug]
+            Through = Post.tags.through
+            Through.objects.bulk_create([
+                Through(post_id=post.pk, tag_id=tag_id)
+                for post, record in zip(posts, records)
+                for tag_id in set(tags[name] for name in record['tags'])])
+            index_posts(posts)
+        self.imported += len(posts)
+
+    def run(self, records, batch_size=500):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+    def finish(self):
+        recount_categories()
+        recount_tags()
+        recount_months()
+        invalidate_feed()
+        invalidate_pages(SITE_GROUP)
+        touch_stamps(POSTS_STAMP, CHROME_STAMP)
@@ -0,0 +1,102 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blogengine.benchmark import scratch_database, seed_corpus
+from blogengine.models import Post
+
+# The indexes added for the blog's access paths, as (table, columns).
+INDEXES = [
+    ('blogengine_post', ['pub_date', 'id']),
+    ('blogengine_post', ['category_id', 'pub_date']),
+    ('blogengine_post_tags', ['tag_id', 'post_id']),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Seeds a scratch database and prints the EXPLAIN plan and timing of "
+            "the blog's list and detail queries, optionally without their indexes.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--posts', type='int', dest='posts', default=100000,
+                    help='Number of posts to seed.'),
+        make_option('--repeat', type='int', dest='repeat', default=20,
+                    help='Number of times each query is timed.'),
+        make_option('--compare', action='store_true', dest='compare', default=False,
+                    help='Also run every query with the indexes dropped.'),
+    )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        with scratch_database():
+            self.stdout.write("Seeding %d posts..." % options['posts'])
+            seed_corpus(posts=options['posts'])
+            self.analyze()
+
+            self.stdout.write("== With indexes")
+            self.run_queries()
+            if options['compare']:
+                self.stdout.write("== Without indexes")
+                try:
+                    with transaction.atomic():
+                        self.drop_indexes()
+                        self.analyze()
+                        self.run_queries()
+                        raise Rollback
+                except Rollback:
+                    pass
+
+    def queries(self):
+        count = Post.objects.count()
+        post = Post.objects.order_by('pub_date')[count // 2]
+        deep = (count // 10) * 9
+        return [
+            ('index first page', Post.objects.order_by('-pub_date', '-id')[:6]),
+            ('index keyset page', Post.objects.filter(pub_date__lt=post.pub_date)
+                                              .order_by('-pub_date', '-id')[:6]),
+            ('index offset page', Post.objects.order_by('-pub_date')[deep:deep + 5]),
+            ('post detail', Post.objects.filter(pub_date__year=post.pub_date.year,
+                                                pub_date__month=post.pub_date.month,
+                                                pub_date__day=post.pub_date.day,
+                                                slug=post.slug)),
+            ('category page', Post.objects.filter(category__slug='bench-category-1')
+                                          .order_by('-pub_date')[:6]),
+            ('tag page', Post.objects.filter(tags__slug='bench-tag-1')
+                                     .order_by('-pub_date')[:6]),
+        ]
+
+    def run_queries(self):
+        cursor = connection.cursor()
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        for name, queryset in self.queries():
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute(explain + sql, params)
+            plan = [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+
+            timings = []
+            for _ in range(self.repeat):
+                start = time.time()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                timings.append((time.time() - start) * 1000)
+            timings.sort()
+
+            self.stdout.write("%s: median %.2fms, max %.2fms" % (
+                name, timings[len(timings) // 2], timings[-1]))
+            for line in plan:
+                self.stdout.write("    %s" % line)
+
+    def drop_indexes(self):
+        from south.db import db
+        for table, columns in INDEXES:
+            db.delete_index(table, columns)
+
+    def analyze(self):
+        if connection.vendor == 'postgresql':
+            connection.cursor().execute('ANALYZE')
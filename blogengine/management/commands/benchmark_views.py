@@ -0,0 +1,194 @@
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+from optparse import make_option
+from wsgiref.util import setup_testing_defaults
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from blogengine.benchmark import scratch_database, seed_corpus
+from blogengine.models import Category, MonthArchive, Post, Tag
+
+HOST = 'benchmark.invalid'
+
+
+def percentile(timings, percent):
+    # Nearest rank over the sorted timings.
+    rank = int(math.ceil(percent / 100.0 * len(timings)))
+    return timings[min(max(rank, 1), len(timings)) - 1]
+
+
+def summarize(timings, elapsed, errors):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': len(timings) / elapsed if elapsed else None,
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p90_ms': percentile(timings, 90),
+        'p99_ms': percentile(timings, 99),
+        'max_ms': timings[-1],
+    }
+
+
+def client_request(client):
+    def request(path):
+        response = client.get(path)
+        if response.streaming:
+            b''.join(response)
+        return response.status_code
+    return request
+
+
+def wsgi_request(application):
+    def request(path):
+        environ = {'PATH_INFO': path, 'HTTP_HOST': HOST, 'SERVER_NAME': HOST}
+        setup_testing_defaults(environ)
+        status = []
+        result = application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for chunk in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(status[0].split()[0])
+    return request
+
+
+class Command(BaseCommand):
+    help = ("Seeds a scratch database with a synthetic corpus and measures requests per "
+            "second and latency percentiles of the blog's routes, through the test "
+            "client and the WSGI application. Results are written as JSON.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--posts', type='int', dest='posts', default=1000,
+                    help='Number of posts to seed.'),
+        make_option('--categories', type='int', dest='categories', default=20,
+                    help='Number of categories to seed.'),
+        make_option('--tags', type='int', dest='tags', default=100,
+                    help='Number of tags to seed.'),
+        make_option('--flatpages', type='int', dest='flatpages', default=5,
+                    help='Number of flatpages to seed.'),
+        make_option('--requests', type='int', dest='requests', default=200,
+                    help='Number of timed requests per route.'),
+        make_option('--warmup', type='int', dest='warmup', default=20,
+                    help='Number of untimed requests per route before timing.'),
+        make_option('--seed', type='int', dest='seed', default=0,
+                    help='Seed of the synthetic corpus.'),
+        make_option('--no-page-cache', action='store_false', dest='page_cache', default=True,
+                    help='Measure the views with the page cache disabled.'),
+        make_option('--output', dest='output', default=None,
+                    help='File the JSON results are written to.'),
+        make_option('--compare', dest='compare', default=None,
+                    help='JSON results of an earlier run to compare with.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('--requests must be at least 1.')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        page_cache = options['page_cache'] and getattr(settings, 'BLOG_PAGE_CACHE', False)
+        with scratch_database():
+            self.stdout.write("Seeding %d posts..." % options['posts'])
+            seed_corpus(posts=options['posts'], categories=options['categories'],
+                        tags=options['tags'], flatpages=options['flatpages'],
+                        seed=options['seed'], markdown=True)
+            with override_settings(ALLOWED_HOSTS=[HOST], BLOG_PAGE_CACHE=page_cache):
+                from tomblog.wsgi import application
+                routes = self.routes()
+                targets = [('client', client_request(Client(HTTP_HOST=HOST))),
+                           ('wsgi', wsgi_request(application))]
+                results = {}
+                for name, path in routes:
+                    results[name] = {'path': path, 'queries': self.count_queries(path)}
+                    for target, request in targets:
+                        results[name][target] = self.measure(request, path, options)
+                        self.report(name, target, results[name], baseline)
+
+        data = {
+            'meta': {
+                'commit': self.git_commit(),
+                'time': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'page_cache': page_cache,
+                'options': dict((key, options[key]) for key in (
+                    'posts', 'categories', 'tags', 'flatpages', 'requests', 'warmup', 'seed')),
+            },
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            self.stdout.write("Results written to %s." % options['output'])
+
+    def routes(self):
+        post = Post.objects.order_by('pub_date')[Post.objects.count() // 2]
+        category = Category.objects.order_by('-post_count')[0]
+        tag = Tag.objects.order_by('-post_count')[0]
+        month = MonthArchive.objects.all()[0]
+        return [
+            ('index', '/'),
+            ('index page 2', '/2/'),
+            ('detail', post.get_absolute_url()),
+            ('category', category.get_absolute_url()),
+            ('tag', tag.get_absolute_url()),
+            ('month archive', month.get_absolute_url()),
+            ('feed', '/feeds/posts/'),
+            ('flatpage', '/bench-page-0/'),
+        ]
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            Client(HTTP_HOST=HOST).get(path)
+        return len(queries)
+
+    def measure(self, request, path, options):
+        for _ in range(options['warmup']):
+            request(path)
+        timings = []
+        errors = 0
+        started = time.time()
+        for _ in range(options['requests']):
+            start = time.time()
+            if request(path) != 200:
+                errors += 1
+            timings.append((time.time() - start) * 1000)
+        return summarize(timings, time.time() - started, errors)
+
+    def report(self, name, target, result, baseline):
+        stats = result[target]
+        line = "%-14s %-6s %8.1f req/s  p50 %7.2fms  p99 %7.2fms  %d queries" % (
+            name, target, stats['rps'], stats['p50_ms'], stats['p99_ms'], result['queries'])
+        try:
+            before = baseline['routes'][name][target]
+        except (TypeError, KeyError):
+            before = None
+        if before:
+            line += "  (p50 %+.1f%%)" % ((stats['p50_ms'] / before['p50_ms'] - 1) * 100)
+        if stats['errors']:
+            line += "  %d error(s)" % stats['errors']
+        self.stdout.write(line)
+
+    def git_commit(self):
+        try:
+            return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                           stderr=subprocess.STDOUT).strip().decode('ascii')
+        except (OSError, subprocess.CalledProcessError):
+            return None
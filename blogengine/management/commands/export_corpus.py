@@ -0,0 +1,203 @@
+import gzip
+import io
+import json
+import os
+import tarfile
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blogengine.models import Category, Post, Tag
+
+
+def taxonomy_rows(queryset):
+    for row in queryset.values('pk', 'name', 'description', 'slug'):
+        yield row.pop('pk'), row
+
+
+def flatpage_rows(queryset):
+    rows = list(queryset.values('pk', 'url', 'title', 'content', 'enable_comments', 'template_name',
+                                'registration_required'))
+    sites = {}
+    for page_id, domain in FlatPage.sites.through.objects.filter(
+            flatpage__in=[row['pk'] for row in rows]).values_list('flatpage', 'site__domain'):
+        sites.setdefault(page_id, []).append(domain)
+    for row in rows:
+        pk = row.pop('pk')
+        row['sites'] = sorted(sites.get(pk, []))
+        yield pk, row
+
+
+def post_rows(queryset):
+    rows = list(queryset.values('pk', 'title', 'slug', 'pub_date', 'modified', 'text', 'category__slug',
+                                'author__username', 'site__domain'))
+    tags = {}
+    for post_id, slug in Post.tags.through.objects.filter(
+            post__in=[row['pk'] for row in rows]).values_list('post', 'tag__slug'):
+        tags.setdefault(post_id, []).append(slug)
+    for row in rows:
+        pk = row.pop('pk')
+        row['category'] = row.pop('category__slug')
+        row['author'] = row.pop('author__username')
+        row['site'] = row.pop('site__domain')
+        row['tags'] = sorted(tags.get(pk, []))
+        yield pk, row
+
+
+# Exported in this order, so a loader meets the categories and tags
+# before the posts that refer to them by slug.
+EXPORTS = (
+    ('blogengine.category', Category, taxonomy_rows),
+    ('blogengine.tag', Tag, taxonomy_rows),
+    ('flatpages.flatpage', FlatPage, flatpage_rows),
+    ('blogengine.post', Post, post_rows),
+)
+
+
+def iter_chunks(model, rows, chunk_size, after=0, since=None):
+    """
+    Yields the rows of ``model`` ``chunk_size`` at a time in primary key
+    order, starting after the ``after`` key, so memory stays flat however
+    large the table is. ``since`` limits posts to those modified later.
+    """
+    queryset = model._default_manager.order_by('pk')
+    if since is not None and model is Post:
+        queryset = queryset.filter(modified__gt=since)
+    while True:
+        chunk = list(rows(queryset.filter(pk__gt=after)[:chunk_size]))
+        if not chunk:
+            return
+        yield chunk
+        after = chunk[-1][0]
+
+
+def encode_lines(label, chunk):
+    return b''.join(
+        json.dumps({'model': label, 'pk': pk, 'fields': fields}, cls=DjangoJSONEncoder,
+                   sort_keys=True).encode('utf-8') + b'\n'
+        for pk, fields in chunk)
+
+
+class JsonLinesArchive(object):
+    """
+    A gzipped JSON Lines file. Every chunk is a gzip member of its own,
+    which gzip and zcat read as one stream.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def create(self):
+        gzip.open(self.path, 'wb').close()
+
+    def write_chunk(self, label, chunk):
+        with gzip.open(self.path, 'ab') as f:
+            f.write(encode_lines(label, chunk))
+
+
+class TarArchive(object):
+    """
+    A tar file with a gzipped JSON Lines member per chunk, named after
+    the model and the primary keys it holds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def create(self):
+        tarfile.open(self.path, 'w').close()
+
+    def write_chunk(self, label, chunk):
+        buf = io.BytesIO()
+        with gzip.GzipFile(filename='', mode='wb', fileobj=buf, mtime=0) as gz:
+            gz.write(encode_lines(label, chunk))
+        info = tarfile.TarInfo('%s/%010d-%010d.jsonl.gz' % (label, chunk[0][0], chunk[-1][0]))
+        info.size = len(buf.getvalue())
+        buf.seek(0)
+        with tarfile.open(self.path, 'a') as tar:
+            tar.addfile(info, buf)
+
+
+def open_archive(path):
+    if path.endswith('.jsonl.gz'):
+        return JsonLinesArchive(path)
+    if path.endswith('.tar'):
+        return TarArchive(path)
+    raise CommandError('The output must be a .jsonl.gz or a .tar file.')
+
+
+class Command(BaseCommand):
+    help = ("Streams every category, tag, flatpage and post to a gzipped JSON Lines "
+            "(.jsonl.gz) or tar (.tar) archive.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output', dest='output', default='corpus.jsonl.gz',
+                    help='Archive to write, its extension picks the format.'),
+        make_option('--since', dest='since', default=None,
+                    help='Only export the posts modified after this ISO 8601 timestamp.'),
+        make_option('--resume', action='store_true', dest='resume', default=False,
+                    help='Continue the interrupted export to --output.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+                    help='Number of rows read and written at a time.'),
+    )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        archive = open_archive(output)
+        state_file = output + '.state'
+
+        if options['resume']:
+            state = self.read_state(state_file)
+            if state is None or not os.path.exists(output):
+                raise CommandError('There is no interrupted export to %s.' % output)
+            # Drop whatever was written after the last finished chunk.
+            with open(output, 'r+b') as f:
+                f.truncate(state['size'])
+        else:
+            state = {'since': options['since'], 'done': {}}
+
+        since = None
+        if state['since']:
+            since = parse_datetime(state['since'])
+            if since is None:
+                raise CommandError('%r is not an ISO 8601 timestamp.' % state['since'])
+            if settings.USE_TZ and timezone.is_naive(since):
+                since = timezone.make_aware(since, timezone.get_current_timezone())
+
+        if not options['resume']:
+            archive.create()
+            state['size'] = os.path.getsize(output)
+            self.write_state(state_file, state)
+
+        exported = 0
+        for label, model, rows in EXPORTS:
+            after = state['done'].get(label, 0)
+            for chunk in iter_chunks(model, rows, options['chunk_size'], after, since):
+                archive.write_chunk(label, chunk)
+                exported += len(chunk)
+                state['done'][label] = chunk[-1][0]
+                state['size'] = os.path.getsize(output)
+                self.write_state(state_file, state)
+
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write("Exported %d row(s) to %s." % (exported, output))
+
+    def read_state(self, state_file):
+        try:
+            with open(state_file) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def write_state(self, state_file, state):
+        # Replace the file at once, so an interruption never leaves half
+        # of it behind.
+        with open(state_file + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.rename(state_file + '.tmp', state_file)
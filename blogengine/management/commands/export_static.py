@@ -0,0 +1,275 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from optparse import make_option
+
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.client import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from blogengine.counts import month_of
+from blogengine.models import Category, MonthArchive, Post, Tag
+from blogengine.views import (CategoryListView, PostIndexView, PostMonthArchiveView, PostYearArchiveView,
+                              TagListView)
+
+STATE_FILE = '.export-state.json'
+FEED_URL = '/feeds/posts/'
+
+
+def page_filename(output, path, content_type):
+    # nginx serves these with: try_files $uri $uri/index.html $uri/index.xml;
+    name = 'index.xml' if 'xml' in content_type else 'index.html'
+    return os.path.join(output, path.strip('/'), name)
+
+
+def export_page(output, host, path, aliases=()):
+    """
+    Renders ``path`` through the full Django stack and writes it below
+    ``output``. Returns an error message, or None on success.
+    """
+    response = Client(HTTP_HOST=host).get(path)
+    if response.status_code != 200:
+        return '%s returned %d' % (path, response.status_code)
+    content = b''.join(response) if response.streaming else response.content
+    for target in (path, ) + tuple(aliases):
+        filename = page_filename(output, target, response.get('Content-Type', ''))
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # Write next to the target and rename, so nginx never serves a
+        # half written page.
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(content)
+        os.rename(filename + '.tmp', filename)
+    return None
+
+
+def numbered_pages(path, count, per_page):
+    """
+    Returns (path, aliases) pairs for the pages listing ``count`` posts at
+    ``path``, the first of which is also linked as page/1/.
+    """
+    page_count = max(1, (count + per_page - 1) // per_page)
+    pages = [(path, ('%spage/1/' % path, ))]
+    pages.extend(('%spage/%d/' % (path, number), ()) for number in range(2, page_count + 1))
+    return pages
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connection, and
+    # caching pages that are written to disk once is wasted work.
+    connection.close()
+    override_settings(BLOG_PAGE_CACHE=False).enable()
+
+
+def _export_page(args):
+    return export_page(*args)
+
+
+class Command(BaseCommand):
+    help = "Renders every blog page, flatpage and the RSS feed to static files for nginx to serve."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--output', dest='output', default='static-site',
+                    help='Directory the pages are written to.'),
+        make_option('--incremental', action='store_true', dest='incremental', default=False,
+                    help='Only render pages affected by posts changed since the last export.'),
+        make_option('--processes', type='int', dest='processes', default=None,
+                    help='Number of rendering processes (defaults to the number of CPUs).'),
+        make_option('--host', dest='host', default=None,
+                    help='Host name the pages are rendered for (defaults to the current site).'),
+    )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        host = options['host'] or Site.objects.get_current().domain
+        processes = options['processes'] or multiprocessing.cpu_count()
+        started = timezone.now()
+
+        chrome = self.chrome_digest()
+        posts = self.post_snapshot()
+        state = self.read_state(output)
+        changed = None
+        if options['incremental']:
+            if state is None:
+                self.stdout.write("No previous export found, exporting everything.")
+            elif state['chrome'] != chrome:
+                self.stdout.write("Categories, tags or flatpages changed, exporting everything.")
+            else:
+                changed = self.changed_posts(state, posts)
+        pages, render = self.collect_pages(posts, changed)
+
+        jobs = [(output, host, path, aliases) for path, aliases in render]
+        if processes > 1:
+            pool = multiprocessing.Pool(processes, initializer=_init_worker)
+            connection.close()
+            try:
+                errors = [error for error in pool.imap_unordered(_export_page, jobs, chunksize=16) if error]
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            with override_settings(BLOG_PAGE_CACHE=False):
+                errors = [error for error in map(_export_page, jobs) if error]
+
+        for error in errors:
+            self.stderr.write(error)
+        paths = set(path for page in pages for path in (page[0], ) + page[1])
+        if state is not None:
+            removed = self.remove_pages(output, set(state['paths']) - paths)
+            if removed:
+                self.stdout.write("Removed %d page(s) no longer on the site." % removed)
+        self.write_state(output, started, chrome, sorted(paths), posts)
+        self.stdout.write("Exported %d page(s) to %s." % (len(jobs) - len(errors), output))
+
+    def post_snapshot(self):
+        """
+        Returns the URL, category, tags and archive month of every post,
+        keyed by primary key as kept in the state file. Comparing them
+        with the last export's finds the pages a post left.
+        """
+        tags = {}
+        for post_id, slug in Post.tags.through.objects.values_list('post_id', 'tag__slug').iterator():
+            tags.setdefault(post_id, []).append(slug)
+        posts = {}
+        for pk, slug, pub_date, category in Post.objects.values_list(
+                'pk', 'slug', 'pub_date', 'category__slug').iterator():
+            posts[str(pk)] = {
+                'url': Post(slug=slug, pub_date=pub_date).get_absolute_url(),
+                'category': category,
+                'tags': sorted(tags.get(pk, ())),
+                'month': list(month_of(pub_date)),
+            }
+        return posts
+
+    def changed_posts(self, state, posts):
+        """
+        Returns the snapshots, old and new, of the posts added, deleted,
+        moved or edited since the export ``state`` was written.
+        """
+        old = state['posts']
+        edited = set(str(pk) for pk in Post.objects.filter(
+            modified__gt=state['exported_at']).values_list('pk', flat=True))
+        changed = []
+        for pk in set(old) | set(posts):
+            if pk in edited or old.get(pk) != posts.get(pk):
+                changed.extend(snapshot for snapshot in (old.get(pk), posts.get(pk)) if snapshot)
+        return changed
+
+    def collect_pages(self, posts, changed=None):
+        """
+        Returns (path, aliases) pairs for every page of the site, and those
+        among them to render: all of them, or only the pages showing any
+        of the ``changed`` post snapshots, including where a post was.
+        """
+        if changed is not None:
+            urls = set(post['url'] for post in changed)
+            categories = set(post['category'] for post in changed)
+            tags = set(slug for post in changed for slug in post['tags'])
+            months = set(tuple(post['month']) for post in changed)
+            years = set(year for year, month in months)
+        pages = []
+        render = []
+
+        def add(entries, affected):
+            pages.extend(entries)
+            if changed is None or affected:
+                render.extend(entries)
+
+        for post in posts.values():
+            add([(post['url'], ())], changed is not None and post['url'] in urls)
+        for slug, post_count in Category.objects.values_list('slug', 'post_count'):
+            add(numbered_pages(Category(slug=slug).get_absolute_url(), post_count,
+                               CategoryListView.paginate_by), changed is not None and slug in categories)
+        for slug, post_count in Tag.objects.values_list('slug', 'post_count'):
+            add(numbered_pages(Tag(slug=slug).get_absolute_url(), post_count,
+                               TagListView.paginate_by), changed is not None and slug in tags)
+        month_counts = dict(((year, month), post_count) for year, month, post_count in
+                            MonthArchive.objects.filter(post_count__gt=0).values_list(
+                                'year', 'month', 'post_count'))
+        year_counts = {}
+        for (year, month), post_count in month_counts.items():
+            year_counts[year] = year_counts.get(year, 0) + post_count
+        for year, month in sorted(month_counts):
+            add(numbered_pages(MonthArchive(year=year, month=month).get_absolute_url(),
+                               month_counts[year, month], PostMonthArchiveView.paginate_by),
+                changed is not None and (year, month) in months)
+        for year in sorted(year_counts):
+            add(numbered_pages('/archive/%d/' % year, year_counts[year], PostYearArchiveView.paginate_by),
+                changed is not None and year in years)
+
+        # Any added, deleted or edited post can move every numbered page
+        # of the index. The bare index pages by cursor, which a static
+        # file cannot do, so it gets a copy of the first numbered page.
+        per_page = PostIndexView.paginate_by
+        page_count = max(1, (len(posts) + per_page - 1) // per_page)
+        index = [('/1/', ('/', ))]
+        index.extend(('/%d/' % number, ()) for number in range(2, page_count + 1))
+        index.append((FEED_URL, ()))
+        add(index, bool(changed))
+
+        site = Site.objects.get_current()
+        for url in FlatPage.objects.filter(sites=site).values_list('url', flat=True):
+            add([(url, ())], True)
+        return pages, render
+
+    def remove_pages(self, output, paths):
+        """
+        Deletes the files of pages the site no longer has, such as a
+        deleted post or numbered pages past a shrunk page count, with the
+        directories they leave empty. Returns the number removed.
+        """
+        removed = 0
+        root = os.path.abspath(output)
+        for path in paths:
+            for content_type in ('text/html', 'application/xml'):
+                filename = page_filename(output, path, content_type)
+                if os.path.isfile(filename):
+                    os.remove(filename)
+                    removed += 1
+            directory = os.path.abspath(os.path.dirname(page_filename(output, path, '')))
+            while directory != root and os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+        return removed
+
+    def chrome_digest(self):
+        """
+        Returns a digest of the category and tag names shown on every list
+        page and of the flatpages in every page's navigation. Changes to
+        them leave Post.modified alone.
+        """
+        digest = hashlib.md5()
+        site = Site.objects.get_current()
+        for rows in (Category.objects.order_by('pk').values_list('pk', 'name', 'slug'),
+                     Tag.objects.order_by('pk').values_list('pk', 'name', 'slug'),
+                     FlatPage.objects.filter(sites=site).order_by('pk').values_list('pk', 'url', 'title')):
+            for row in rows.iterator():
+                digest.update(json.dumps(row).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def read_state(self, output):
+        try:
+            with open(os.path.join(output, STATE_FILE)) as f:
+                state = json.load(f)
+            exported_at = parse_datetime(state['exported_at'])
+            paths, posts = state['paths'], state['posts']
+        except (IOError, ValueError, KeyError):
+            return None
+        if exported_at is None:
+            return None
+        return {'exported_at': exported_at, 'chrome': state.get('chrome'), 'paths': paths, 'posts': posts}
+
+    def write_state(self, output, started, chrome, paths, posts):
+        if not os.path.isdir(output):
+            os.makedirs(output)
+        with open(os.path.join(output, STATE_FILE), 'w') as f:
+            json.dump({'exported_at': started.isoformat(), 'chrome': chrome, 'paths': paths,
+                       'posts': posts}, f)
@@ -0,0 +1,53 @@
+import multiprocessing
+from optparse import make_option
+
+from django.contrib.auth.models import User
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blogengine.importer import PostImporter, iter_sources
+
+
+class Command(BaseCommand):
+    args = '<feed file or Markdown directory> ...'
+    help = ("Imports posts from RSS/Atom files and from Markdown files with front matter "
+            "(title, date, slug, category and tags lines between two --- lines).")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--author', dest='author',
+                    help='Username of the author of the imported posts.'),
+        make_option('--category', dest='category', default=None,
+                    help='Category of the posts whose source names none.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=500,
+                    help='Number of posts inserted per transaction.'),
+        make_option('--jobs', type='int', dest='jobs', default=multiprocessing.cpu_count(),
+                    help='Number of processes rendering the Markdown, 1 renders in this one.'),
+    )
+
+    def handle(self, *paths, **options):
+        if not paths:
+            raise CommandError('Name at least one feed file or Markdown directory.')
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError('There is no user named %r, see --author.' % options['author'])
+        site = Site.objects.get_current()
+
+        pool = None
+        if options['jobs'] > 1:
+            # Forked workers must not share the database connection.
+            connection.close()
+            pool = multiprocessing.Pool(options['jobs'])
+        importer = PostImporter(author, site, render_many=pool.map if pool else map,
+                                default_category=options['category'])
+        try:
+            importer.run(iter_sources(paths), options['batch_size'])
+        finally:
+            if pool is not None:
+                pool.terminate()
+            # The batches committed before a failure need their counts
+            # and caches brought up to date too.
+            importer.finish()
+        self.stdout.write("Imported %d post(s), skipped %d already imported." % (
+            importer.imported, importer.skipped))
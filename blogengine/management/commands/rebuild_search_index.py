@@ -0,0 +1,37 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from blogengine.models import Post
+from blogengine.search import SEARCH_VECTOR_SQL, index_posts, search_config, use_tsvector
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full text search index of every post."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=500,
+                    help='Number of posts indexed per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        if use_tsvector():
+            config = search_config()
+            connection.cursor().execute(
+                "UPDATE blogengine_post SET search_vector = " + SEARCH_VECTOR_SQL, [config, config])
+            self.stdout.write("Rebuilt the search vectors of every post.")
+            return
+
+        indexed = 0
+        last_pk = 0
+        while True:
+            batch = list(Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                         .only('pk', 'title', 'text')[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                index_posts(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write("Indexed %d post(s)." % indexed)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogengine.counts import recount_categories, recount_months, recount_tags
+
+
+class Command(BaseCommand):
+    help = "Recounts the denormalized post counts of every category, tag and month."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_categories()
+            recount_tags()
+            recount_months()
+        self.stdout.write("Recounted the posts of every category, tag and month.")
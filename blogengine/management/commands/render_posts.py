@@ -0,0 +1,44 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blogengine.markup import markdown_digest, render_markdown
+from blogengine.models import Post
+
+
+class Command(BaseCommand):
+    help = "Re-renders the stored Markdown HTML of every post whose text or extension set changed."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--force', action='store_true', dest='force', default=False,
+                    help='Render every post, even those that are up to date.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=500,
+                    help='Number of posts updated per transaction.'),
+    )
+
+    def handle(self, *args, **options):
+        force = options['force']
+        batch_size = options['batch_size']
+
+        rendered = 0
+        last_pk = 0
+        while True:
+            # Walk the table in primary key order so memory use stays flat
+            # however large the archive is.
+            batch = list(Post.objects.filter(pk__gt=last_pk)
+                         .order_by('pk')
+                         .values_list('pk', 'text', 'text_hash')[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                for pk, text, text_hash in batch:
+                    digest = markdown_digest(text)
+                    if force or digest != text_hash:
+                        Post.objects.filter(pk=pk).update(
+                            rendered_text=render_markdown(text),
+                            text_hash=digest)
+                        rendered += 1
+            last_pk = batch[-1][0]
+
+        self.stdout.write("Rendered %d post(s)." % rendered)
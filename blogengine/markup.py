@@ -0,0 +1,102 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.encoding import force_unicode
+
+import markdown
+
+MARKDOWN_EXTENSIONS = ["nl2br", ]
+
+
+def render_markdown(value):
+    return markdown.markdown(force_unicode(value),
+                             MARKDOWN_EXTENSIONS,
+                             safe_mode=True,
+                             enable_attributes=False)
+
+
+def markdown_digest(value):
+    # The extension set is part of the digest so that changing it marks
+    # every previously rendered text as stale.
+    digest = hashlib.sha1(u",".join(MARKDOWN_EXTENSIONS).encode('utf-8'))
+    digest.update(b"\0")
+    digest.update(force_unicode(value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RenderCache(object):
+    """
+    A thread safe LRU cache of rendered Markdown, bounded both by the
+    number of entries and by the total size of the cached HTML.
+    """
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                html = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = html
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        # Sizes are approximated as two bytes per character.
+        cost = len(html) * 2
+        if cost > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key)) * 2
+            self._entries[key] = html
+            self.size += cost
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted) * 2
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+render_cache = RenderCache(
+    getattr(settings, 'MARKDOWN_CACHE_MAX_ENTRIES', 1000),
+    getattr(settings, 'MARKDOWN_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+)
+
+
+def render_markdown_cached(value):
+    key = markdown_digest(value)
+    html = render_cache.get(key)
+    if html is None:
+        html = render_markdown(value)
+        render_cache.set(key, html)
+    return html
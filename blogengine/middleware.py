@@ -0,0 +1,91 @@
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from blogengine.performance import add_timing, finish_request, histogram, start_request
+
+
+def url_pattern(request):
+    """
+    Names the URL pattern a request was routed to, after its view.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    if match.url_name:
+        return match.url_name
+    func = match.func
+    return '%s.%s' % (func.__module__, getattr(func, '__name__', type(func).__name__))
+
+
+class PerformanceMiddleware(object):
+    """
+    Times every request: wall time, SQL queries and their time, template
+    rendering of TemplateResponses and the custom_markdown filter. The
+    timings are sent in a Server-Timing header and added to the per URL
+    pattern histogram of blogengine.performance, which is written to
+    BLOG_PERFORMANCE_DUMP_FILE every BLOG_PERFORMANCE_DUMP_INTERVAL seconds
+    and shown to staff at /admin/performance/.
+
+    List it first in MIDDLEWARE_CLASSES so it times the other middleware.
+    """
+
+    def __init__(self):
+        self.last_dump = time.time()
+
+    def process_request(self, request):
+        request._performance_start = time.time()
+        request._performance_queries = []
+        start_request()
+        # Log the queries of this request even with DEBUG off.
+        for connection in connections.all():
+            request._performance_queries.append(
+                (connection, connection.use_debug_cursor, len(connection.queries)))
+            connection.use_debug_cursor = True
+
+    def process_template_response(self, request, response):
+        start = time.time()
+        response.add_post_render_callback(lambda r: add_timing('template', time.time() - start))
+        return response
+
+    def process_response(self, request, response):
+        start = getattr(request, '_performance_start', None)
+        if start is None:
+            return response
+        timings = finish_request()
+
+        queries = sql = 0
+        for connection, use_debug_cursor, logged in request._performance_queries:
+            executed = connection.queries[logged:]
+            queries += len(executed)
+            sql += sum(float(query['time']) for query in executed)
+            connection.use_debug_cursor = use_debug_cursor
+            if not (use_debug_cursor or settings.DEBUG):
+                # Nobody else is collecting them.
+                del connection.queries[logged:]
+
+        metrics = {
+            'wall_ms': (time.time() - start) * 1000,
+            'queries': queries,
+            'sql_ms': sql * 1000,
+            'template_ms': timings.get('template', 0.0) * 1000,
+            'markdown_ms': timings.get('markdown', 0.0) * 1000,
+        }
+        response['Server-Timing'] = ', '.join([
+            'total;dur=%.1f' % metrics['wall_ms'],
+            'db;dur=%.1f;desc="%d queries"' % (metrics['sql_ms'], queries),
+            'template;dur=%.1f' % metrics['template_ms'],
+            'markdown;dur=%.1f' % metrics['markdown_ms'],
+        ])
+        histogram.record(url_pattern(request), metrics)
+        self.dump()
+        return response
+
+    def dump(self):
+        filename = getattr(settings, 'BLOG_PERFORMANCE_DUMP_FILE', None)
+        interval = getattr(settings, 'BLOG_PERFORMANCE_DUMP_INTERVAL', 60)
+        if filename and time.time() - self.last_dump >= interval:
+            self.last_dump = time.time()
+            histogram.dump(filename % {'pid': os.getpid()})
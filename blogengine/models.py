@@ -1,17 +1,19 @@
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.contrib.sites.models import Site
-from django.utils.text import slugify
+from blogengine.markup import markdown_digest, render_markdown
+from blogengine.slugs import save_with_slug
 # Create your models here
 class Category(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     slug = models.SlugField(max_length=40, unique=True, blank=True, null=True)
+    post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
 
     def save(self):
-        if not self.slug:
-            self.slug = slugify(unicode(self.name))
-        super(Category, self).save()
+        save_with_slug(self, self.name, super(Category, self).save)
 
     def get_absolute_url(self):
         return "/category/%s/" % (self.slug)
@@ -26,14 +28,17 @@ class Tag (models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
     slug = models.SlugField(max_length=40, unique=True, blank=True, null=True)
+    post_count = models.PositiveIntegerField(default=0, db_index=True, editable=False)
     def save(self):
-        if not self.slug:
-            self.slug = slugify(unicode(self.name))
-        super(Tag, self).save()
+        save_with_slug(self, self.name, super(Tag, self).save)
     def get_absolute_url(self):
         return "/tag/%s/" % (self.slug)
     def __unicode__(self):
         return self.name
+class PostManager(models.Manager):
+    def listing(self):
+        return self.get_queryset().select_related('category', 'author', 'site').prefetch_related('tags')
+
 class Post(models.Model):
     title = models.CharField(max_length=200)
     pub_date = models.DateTimeField()
@@ -43,6 +48,26 @@ class Post(models.Model):
     site = models.ForeignKey(Site)
     category = models.ForeignKey(Category, blank=True, null=True)
     tags = models.ManyToManyField(Tag)
+    rendered_text = models.TextField(blank=True, editable=False)
+    text_hash = models.CharField(max_length=40, blank=True, editable=False)
+    modified = models.DateTimeField(auto_now=True)
+    # A digest of the feed entry or file an imported post came from, which
+    # lets blogengine.importer skip it when an import is run again.
+    import_key = models.CharField(max_length=40, blank=True, db_index=True, editable=False)
+
+    objects = PostManager()
+
+    def render(self, force=False):
+        digest = markdown_digest(self.text)
+        if force or digest != self.text_hash:
+            self.rendered_text = render_markdown(self.text)
+            self.text_hash = digest
+            return True
+        return False
+
+    def save(self, *args, **kwargs):
+        self.render()
+        save_with_slug(self, self.title, lambda: super(Post, self).save(*args, **kwargs))
 
     def get_absolute_url(self):
         return "/%s/%s/%s/%s/" % (self.pub_date.year, self.pub_date.month, self.pub_date.day, self.slug)
@@ -52,4 +77,56 @@ class Post(models.Model):
 
     class Meta:
         ordering = ["-pub_date"]
+        # Match the index and taxonomy listings, which filter on the
+        # category and page through posts by (pub_date, id).
+        index_together = [
+            ["pub_date", "id"],
+            ["category", "pub_date"],
+        ]
+
+
+class SearchTerm(models.Model):
+    # The inverted index used by blogengine.search on databases without
+    # PostgreSQL full text search.
+    term = models.CharField(max_length=40)
+    post = models.ForeignKey(Post)
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = [("term", "post")]
+
+
+class MonthArchive(models.Model):
+    # The number of posts published per month, kept up to date by
+    # blogengine.counts so the archive sidebar never groups the posts.
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    post_count = models.PositiveIntegerField(default=0)
+
+    @property
+    def date(self):
+        return datetime.date(self.year, self.month, 1)
+
+    def get_absolute_url(self):
+        return "/archive/%s/%s/" % (self.year, self.month)
+
+    def __unicode__(self):
+        return u"%d-%02d" % (self.year, self.month)
+
+    class Meta:
+        ordering = ["-year", "-month"]
+        unique_together = [("year", "month")]
+
+
+class ChangeStamp(models.Model):
+    # When a kind of content last changed, kept by blogengine.stamps for
+    # the conditional GET validators. In the database every process sees
+    # the same stamps, which a per process cache would not.
+    name = models.CharField(max_length=20, unique=True)
+    modified = models.DateTimeField()
+
+    def __unicode__(self):
+        return self.name
 
+# Connect the cache invalidation receivers once the models are defined.
+import blogengine.signals
@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+class UncountedPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super(UncountedPage, self).__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def __repr__(self):
+        return '<Page %s>' % self.number
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class UncountedPaginator(Paginator):
+    """
+    A paginator that never runs COUNT(*). It fetches one row more than a
+    page holds to find out whether there is a next page, so num_pages and
+    count are not available.
+    """
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        has_next = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if not object_list and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        return UncountedPage(object_list, number, self, has_next)
+
+
+def estimated_count(queryset, threshold):
+    """
+    Returns the planner's row estimate from pg_class for an unfiltered
+    PostgreSQL queryset of more than ``threshold`` rows, otherwise None.
+    """
+    if not isinstance(queryset, QuerySet):
+        return None
+    connection = connections[queryset.db]
+    query = queryset.query
+    if (connection.vendor != 'postgresql' or query.where or query.having
+            or query.distinct or not query.can_filter()):
+        return None
+    cursor = connection.cursor()
+    cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                   [connection.ops.quote_name(queryset.model._meta.db_table)])
+    row = cursor.fetchone()
+    # reltuples is 0 or -1 until the table is first analyzed.
+    if row is None or row[0] < threshold:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(UncountedPaginator):
+    """
+    A paginator that counts an unfiltered table of more than
+    ``estimate_threshold`` rows from the PostgreSQL statistics instead of
+    scanning it with COUNT(*). Filtered and smaller querysets are counted
+    exactly. Pages past an estimate that is too low still work.
+    """
+    estimate_threshold = 10000
+
+    def _get_count(self):
+        if self._count is None:
+            self._count = estimated_count(self.object_list, self.estimate_threshold)
+            if self._count is None:
+                return super(EstimatedCountPaginator, self)._get_count()
+        return self._count
+    count = property(_get_count)
+
+
+class EstimatedCountQuerySet(QuerySet):
+    """
+    A queryset whose count() of an unfiltered table is estimated like
+    EstimatedCountPaginator's.
+    """
+    estimate_threshold = EstimatedCountPaginator.estimate_threshold
+
+    def count(self):
+        estimate = estimated_count(self, self.estimate_threshold)
+        if estimate is None:
+            return super(EstimatedCountQuerySet, self).count()
+        return estimate
+
+
+def encode_cursor(post):
+    pub_date = post.pub_date
+    if timezone.is_aware(pub_date):
+        pub_date = timezone.make_naive(pub_date, timezone.utc)
+    return '%s.%d' % (pub_date.strftime(CURSOR_DATE_FORMAT), post.pk)
+
+
+def decode_cursor(cursor):
+    try:
+        pub_date, pk = cursor.split('.')
+        pub_date = datetime.strptime(pub_date, CURSOR_DATE_FORMAT)
+        pk = int(pk)
+    except ValueError:
+        raise InvalidPage('That cursor is not valid')
+    if settings.USE_TZ:
+        pub_date = timezone.make_aware(pub_date, timezone.utc)
+    return pub_date, pk
+
+
+class KeysetPage(object):
+    """
+    A page of posts located by a (pub_date, id) cursor instead of an
+    offset, so every page costs the same single indexed range query.
+    """
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, count=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count = count
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_cursor(self):
+        return encode_cursor(self.object_list[-1])
+
+    def previous_cursor(self):
+        return encode_cursor(self.object_list[0])
+
+
+def keyset_page(queryset, per_page, after=None, before=None, count=False):
+    """
+    Returns the KeysetPage of ``queryset`` following the ``after`` cursor
+    or preceding the ``before`` cursor, newest posts first.
+    """
+    total = queryset.count() if count else None
+    if before:
+        pub_date, pk = decode_cursor(before)
+        queryset = queryset.filter(Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk))
+        object_list = list(queryset.order_by('pub_date', 'pk')[:per_page + 1])
+        has_previous = len(object_list) > per_page
+        object_list = object_list[:per_page]
+        object_list.reverse()
+        has_next = True
+    else:
+        if after:
+            pub_date, pk = decode_cursor(after)
+            queryset = queryset.filter(Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+        object_list = list(queryset.order_by('-pub_date', '-pk')[:per_page + 1])
+        has_next = len(object_list) > per_page
+        object_list = object_list[:per_page]
+        has_previous = bool(after)
+
+    return KeysetPage(object_list, has_next, has_previous, total)
+
+
+def iter_keyset(queryset, chunk_size=100, limit=None):
+    """
+    Yields up to ``limit`` posts of ``queryset`` newest first, fetching
+    them ``chunk_size`` at a time so that only one chunk is in memory.
+    """
+    after = None
+    while limit is None or limit > 0:
+        size = chunk_size if limit is None else min(chunk_size, limit)
+        page = keyset_page(queryset, size, after=after)
+        for post in page:
+            yield post
+        if not page.has_next():
+            return
+        if limit is not None:
+            limit -= len(page)
+        after = page.next_cursor()
@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Upper bounds of the wall time buckets in milliseconds, the last one is
+# open ended.
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, None)
+METRICS = ('wall_ms', 'queries', 'sql_ms', 'template_ms', 'markdown_ms')
+
+_local = threading.local()
+
+
+def start_request():
+    _local.timings = {}
+
+
+def finish_request():
+    timings = getattr(_local, 'timings', None) or {}
+    _local.timings = None
+    return timings
+
+
+def add_timing(name, seconds):
+    """
+    Adds ``seconds`` to the ``name`` timing of the request being handled by
+    this thread, if PerformanceMiddleware is timing one.
+    """
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(name):
+    start = time.time()
+    try:
+        yield
+    finally:
+        add_timing(name, time.time() - start)
+
+
+def bucket_index(wall_ms):
+    for index, bound in enumerate(BUCKETS):
+        if bound is None or wall_ms <= bound:
+            return index
+
+
+class RollingHistogram(object):
+    """
+    Request statistics per URL pattern over the last ``window`` seconds.
+    Requests are kept in ``slots`` slices of the window, so old ones age
+    out a slice at a time and recording never scans the history.
+    """
+
+    def __init__(self, window=300, slots=10):
+        self.slots = slots
+        self.slot_length = float(window) / slots
+        self._slices = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, now):
+        return int((time.time() if now is None else now) / self.slot_length)
+
+    def record(self, pattern, metrics, now=None):
+        slot = self._slot(now)
+        with self._lock:
+            for old in [old for old in self._slices if old <= slot - self.slots]:
+                del self._slices[old]
+            patterns = self._slices.setdefault(slot, {})
+            if pattern not in patterns:
+                patterns[pattern] = dict.fromkeys(METRICS + ('count', 'max_wall_ms'), 0)
+                patterns[pattern]['buckets'] = [0] * len(BUCKETS)
+            stats = patterns[pattern]
+            stats['count'] += 1
+            for key in METRICS:
+                stats[key] += metrics[key]
+            stats['max_wall_ms'] = max(stats['max_wall_ms'], metrics['wall_ms'])
+            stats['buckets'][bucket_index(metrics['wall_ms'])] += 1
+
+    def snapshot(self, now=None):
+        """
+        Returns the totals, means and wall time percentiles of every URL
+        pattern requested within the window.
+        """
+        slot = self._slot(now)
+        merged = {}
+        with self._lock:
+            for started, patterns in self._slices.items():
+                if started <= slot - self.slots:
+                    continue
+                for pattern, stats in patterns.items():
+                    total = merged.setdefault(pattern, {'count': 0, 'max_wall_ms': 0,
+                                                        'buckets': [0] * len(BUCKETS)})
+                    total['count'] += stats['count']
+                    total['max_wall_ms'] = max(total['max_wall_ms'], stats['max_wall_ms'])
+                    for key in METRICS:
+                        total[key] = total.get(key, 0) + stats[key]
+                    total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+
+        for total in merged.values():
+            for key in METRICS:
+                total['mean_' + key] = total[key] / float(total['count'])
+            for percentile in (50, 95, 99):
+                total['p%d_wall_ms' % percentile] = self._percentile(total, percentile)
+        return merged
+
+    def _percentile(self, total, percentile):
+        # Reported as the upper bound of the bucket the percentile falls in.
+        wanted = total['count'] * percentile / 100.0
+        seen = 0
+        for bound, count in zip(BUCKETS, total['buckets']):
+            seen += count
+            if seen >= wanted:
+                return total['max_wall_ms'] if bound is None else min(bound, total['max_wall_ms'])
+        return total['max_wall_ms']
+
+    def dump(self, filename):
+        # Write next to the target and rename, so readers never see half
+        # a file.
+        data = {'pid': os.getpid(), 'time': time.time(), 'patterns': self.snapshot()}
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.rename(filename + '.tmp', filename)
+
+
+# Each process keeps its own histogram.
+histogram = RollingHistogram(window=getattr(settings, 'BLOG_PERFORMANCE_WINDOW', 300))
@@ -0,0 +1,135 @@
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Sum
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+STOP_WORDS = frozenset(('a an and are as at be but by for from has have if in into is it its '
+                        'of on or that the their this to was were will with').split())
+TITLE_WEIGHT = 5
+
+# PostgreSQL keeps a weighted tsvector per post behind a GIN index, see
+# migration 0012. Other databases use the SearchTerm inverted index.
+SEARCH_VECTOR_SQL = ("setweight(to_tsvector(%s, coalesce(title, '')), 'A') || "
+                     "setweight(to_tsvector(%s, coalesce(text, '')), 'B')")
+
+
+def use_tsvector():
+    return connection.vendor == 'postgresql'
+
+
+def search_config():
+    return getattr(settings, 'BLOG_SEARCH_CONFIG', 'english')
+
+
+def tokenize(text):
+    return [word[:40] for word in WORD_RE.findall(text.lower())
+            if len(word) > 1 and word not in STOP_WORDS]
+
+
+def post_terms(post):
+    weights = defaultdict(int)
+    for term in tokenize(post.title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(post.text):
+        weights[term] += 1
+    return weights
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def index_posts(posts):
+    """
+    Indexes ``posts`` with one statement per step however many there are,
+    for bulk imports.
+    """
+    if not posts:
+        return
+    if use_tsvector():
+        config = search_config()
+        connection.cursor().execute(
+            "UPDATE blogengine_post SET search_vector = " + SEARCH_VECTOR_SQL + " WHERE id IN %s",
+            [config, config, tuple(post.pk for post in posts)])
+        return
+    SearchTerm.objects.filter(post__in=[post.pk for post in posts]).delete()
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, post_id=post.pk, weight=weight)
+        for post in posts
+        for term, weight in post_terms(post).items()])
+
+
+class RankedPostList(object):
+    """
+    Lazily maps a ranked queryset of post ids onto posts, so a paginator
+    only loads the posts of the page it shows.
+    """
+
+    def __init__(self, ranked_ids):
+        self.ranked_ids = ranked_ids
+
+    def count(self):
+        return self.ranked_ids.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = [row['post'] for row in self.ranked_ids[index]]
+        posts = Post.objects.listing().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_posts(query):
+    """
+    Returns the posts matching every word of ``query``, best match first.
+    """
+    if use_tsvector():
+        config = search_config()
+        tsquery = "plainto_tsquery(%s, %s)"
+        return Post.objects.listing().extra(
+            select={'rank': "ts_rank(search_vector, %s)" % tsquery},
+            select_params=[config, query],
+            where=["search_vector @@ %s" % tsquery],
+            params=[config, query],
+        ).order_by('-rank', '-pub_date')
+
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+    ranked_ids = (SearchTerm.objects.filter(term__in=terms)
+                  .values('post')
+                  .annotate(matches=Count('term'), score=Sum('weight'))
+                  .filter(matches=len(terms))
+                  .order_by('-score', '-post'))
+    return RankedPostList(ranked_ids)
+
+
+def match_posts(queryset, query):
+    """
+    Narrows ``queryset`` to the posts matching every word of ``query``,
+    keeping its ordering.
+    """
+    if use_tsvector():
+        return queryset.extra(where=["search_vector @@ plainto_tsquery(%s, %s)"],
+                              params=[search_config(), query])
+
+    terms = set(tokenize(query))
+    if not terms:
+        return queryset.none()
+    matching_ids = (SearchTerm.objects.filter(term__in=terms)
+                    .values('post')
+                    .annotate(matches=Count('term'))
+                    .filter(matches=len(terms))
+                    .values_list('post', flat=True))
+    return queryset.filter(pk__in=matching_ids)
+
+
+# Imported last: the models connect blogengine.signals, which uses
+# index_post().
+from blogengine.models import Post, SearchTerm
@@ -0,0 +1,207 @@
+from django.contrib.flatpages.models import FlatPage
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from blogengine.cache import (ARCHIVE_GROUP, INDEX_GROUP, SITE_GROUP, SITEMAP_INDEX_GROUP, category_group,
+                              invalidate_feed, invalidate_nav, invalidate_pages, invalidate_sidebar,
+                              post_group, sitemap_group, tag_group)
+from blogengine.counts import month_of, recount_categories, recount_months, recount_tags
+from blogengine.models import Category, Post, Tag
+from blogengine.search import index_post
+from blogengine.sitemaps import shard_of
+from blogengine.stamps import CHROME_STAMP, POSTS_STAMP, touch_stamps
+
+
+def post_page_groups(post_ids):
+    """
+    Returns the cached page groups that show any of the given posts: the
+    index and archives, their detail pages and their category and tag
+    pages.
+    """
+    groups = set([INDEX_GROUP, ARCHIVE_GROUP])
+    for slug, category_slug in Post.objects.filter(pk__in=post_ids).values_list('slug', 'category__slug'):
+        groups.add(post_group(slug))
+        if category_slug:
+            groups.add(category_group(category_slug))
+    for slug in Tag.objects.filter(post__pk__in=post_ids).values_list('slug', flat=True).distinct():
+        groups.add(tag_group(slug))
+    return groups
+
+
+def sitemap_groups(section, ids, added=False):
+    """
+    Returns the groups of the sitemap shards listing the rows ``ids`` of
+    ``section``, and of the sitemap index if rows were ``added`` or
+    removed.
+    """
+    groups = set(sitemap_group(section, shard_of(pk)) for pk in ids if pk)
+    if added:
+        groups.add(SITEMAP_INDEX_GROUP)
+    return groups
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def remember_post_groups(sender, instance, **kwargs):
+    # The old slug, category and tags are gone once the row is written.
+    instance._stale_page_groups = post_page_groups([instance.pk]) if instance.pk else set()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    invalidate_feed()
+    touch_stamps(POSTS_STAMP)
+    groups = set(getattr(instance, '_stale_page_groups', ()))
+    groups.update([INDEX_GROUP, ARCHIVE_GROUP, post_group(instance.slug)])
+    if instance.category_id:
+        groups.add(category_group(instance.category.slug))
+    # Category and tag sitemaps show the newest modification of their posts.
+    created_or_deleted = kwargs.get('created', True)
+    groups.update(sitemap_groups('posts', [instance.pk], created_or_deleted))
+    groups.update(sitemap_groups('categories', [instance.category_id,
+                                                getattr(instance, '_stale_category_id', None)]))
+    if 'created' in kwargs:
+        tag_ids = instance.tags.values_list('pk', flat=True)
+    else:
+        tag_ids = getattr(instance, '_stale_tag_ids', [])
+    groups.update(sitemap_groups('tags', tag_ids))
+    invalidate_pages(*groups)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, **kwargs):
+    index_post(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_counts(sender, instance, **kwargs):
+    instance._stale_category_id = instance._stale_pub_date = None
+    if instance.pk:
+        instance._stale_category_id, instance._stale_pub_date = Post.objects.filter(
+            pk=instance.pk).values_list('category_id', 'pub_date').first() or (None, None)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_tags(sender, instance, **kwargs):
+    # The through rows are deleted without an m2m_changed signal.
+    instance._stale_tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Post)
+def post_counts_changed(sender, instance, created, **kwargs):
+    old_category_id = getattr(instance, '_stale_category_id', None)
+    if created or old_category_id != instance.category_id:
+        recount_categories([old_category_id, instance.category_id])
+    old_pub_date = getattr(instance, '_stale_pub_date', None)
+    if old_pub_date is None:
+        recount_months([month_of(instance.pub_date)])
+    elif month_of(old_pub_date) != month_of(instance.pub_date):
+        recount_months([month_of(old_pub_date), month_of(instance.pub_date)])
+
+
+@receiver(post_delete, sender=Post)
+def post_counts_deleted(sender, instance, **kwargs):
+    recount_categories([instance.category_id])
+    recount_tags(getattr(instance, '_stale_tag_ids', []))
+    recount_months([month_of(instance.pub_date)])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def taxonomy_counts_saved(sender, instance, created, **kwargs):
+    # save() wrote back the post_count the instance was loaded with, which
+    # is stale if its posts changed since.
+    if not created:
+        (recount_categories if sender is Category else recount_tags)([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Tagging does not save the post, so bump Post.modified by hand to
+    # keep the conditional GET validators of its pages honest.
+    if action == 'pre_clear':
+        if reverse:
+            instance._cleared_pks = list(instance.post_set.values_list('pk', flat=True))
+        else:
+            instance._cleared_pks = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_cleared_pks', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if not pk_set:
+        return
+
+    if reverse:
+        post_ids = pk_set
+        groups = post_page_groups(post_ids)
+        groups.add(tag_group(instance.slug))
+    else:
+        post_ids = [instance.pk]
+        groups = set([INDEX_GROUP, ARCHIVE_GROUP, post_group(instance.slug)])
+        groups.update(tag_group(slug) for slug in
+                      Tag.objects.filter(pk__in=pk_set).values_list('slug', flat=True))
+    Post.objects.filter(pk__in=post_ids).update(modified=timezone.now())
+    touch_stamps(POSTS_STAMP)
+    tag_ids = [instance.pk] if reverse else pk_set
+    recount_tags(tag_ids)
+    groups.update(sitemap_groups('posts', post_ids))
+    groups.update(sitemap_groups('tags', tag_ids))
+    invalidate_pages(*groups)
+
+
+@receiver(pre_save, sender=Category)
+@receiver(pre_save, sender=Tag)
+def remember_taxonomy_slug(sender, instance, **kwargs):
+    instance._stale_slug = None
+    if instance.pk:
+        instance._stale_slug = sender.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Deleting a category cascades to its posts, which purge their own pages.
+    groups = set([INDEX_GROUP, ARCHIVE_GROUP, category_group(instance.slug)])
+    if getattr(instance, '_stale_slug', None):
+        groups.add(category_group(instance._stale_slug))
+    if kwargs.get('created') is False:
+        groups.update(post_group(slug) for slug in
+                      Post.objects.filter(category=instance).values_list('slug', flat=True))
+    groups.update(sitemap_groups('categories', [instance.pk], kwargs.get('created', True)))
+    invalidate_pages(*groups)
+    invalidate_sidebar()
+    touch_stamps(CHROME_STAMP)
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_posts(sender, instance, **kwargs):
+    instance._stale_page_groups = post_page_groups(instance.post_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    groups = set(getattr(instance, '_stale_page_groups', ()))
+    groups.update([INDEX_GROUP, ARCHIVE_GROUP, tag_group(instance.slug)])
+    if getattr(instance, '_stale_slug', None):
+        groups.add(tag_group(instance._stale_slug))
+    if kwargs.get('created') is False:
+        groups.update(post_group(slug) for slug in
+                      instance.post_set.values_list('slug', flat=True))
+    groups.update(sitemap_groups('tags', [instance.pk], kwargs.get('created', True)))
+    invalidate_pages(*groups)
+    invalidate_sidebar()
+    touch_stamps(CHROME_STAMP)
+
+
+@receiver(post_save, sender=FlatPage)
+@receiver(post_delete, sender=FlatPage)
+@receiver(m2m_changed, sender=FlatPage.sites.through)
+def flatpage_changed(sender, instance, **kwargs):
+    # Every page lists the flatpages in its navigation bar.
+    invalidate_nav()
+    invalidate_pages(SITE_GROUP)
+    touch_stamps(CHROME_STAMP)
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.flatpages.models import FlatPage
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.db.models import Max
+
+from blogengine.models import Category, Post, Tag
+
+
+def shard_size():
+    return getattr(settings, 'BLOG_SITEMAP_SHARD_SIZE', 5000)
+
+
+def shard_of(pk):
+    # Shards are fixed primary key ranges, so a row never moves to
+    # another shard and a change only stales the shard holding it.
+    return (pk - 1) // shard_size() + 1
+
+
+def post_entries(queryset):
+    for slug, pub_date, modified in queryset.values_list('slug', 'pub_date', 'modified').iterator():
+        yield Post(slug=slug, pub_date=pub_date).get_absolute_url(), modified
+
+
+def taxonomy_entries(model):
+    # A category or tag page changes whenever one of its posts does.
+    def entries(queryset):
+        rows = (queryset.filter(post_count__gt=0).annotate(lastmod=Max('post__modified'))
+                .values_list('slug', 'lastmod'))
+        for slug, lastmod in rows.iterator():
+            yield model(slug=slug).get_absolute_url(), lastmod
+    return entries
+
+
+def flatpage_entries(queryset):
+    # Pages behind a login only redirect crawlers to it.
+    queryset = queryset.filter(sites=Site.objects.get_current(), registration_required=False)
+    for url in queryset.values_list('url', flat=True).iterator():
+        yield url, None
+
+
+SECTIONS = OrderedDict([
+    ('posts', (Post, post_entries)),
+    ('categories', (Category, taxonomy_entries(Category))),
+    ('tags', (Tag, taxonomy_entries(Tag))),
+    ('flatpages', (FlatPage, flatpage_entries)),
+])
+
+
+def section_shards(section):
+    """
+    Returns the numbers of the shards of ``section`` that hold any rows.
+    """
+    model = SECTIONS[section][0]
+    column = '%s.%s' % (connection.ops.quote_name(model._meta.db_table),
+                        connection.ops.quote_name(model._meta.pk.column))
+    shards = (model._default_manager.order_by()
+              .extra(select={'shard': '(%s - 1) / %%s + 1' % column}, select_params=[shard_size()])
+              .values_list('shard', flat=True).distinct())
+    return sorted(shards)
+
+
+def shard_queryset(section, shard):
+    model = SECTIONS[section][0]
+    size = shard_size()
+    return model._default_manager.filter(pk__gt=(shard - 1) * size, pk__lte=shard * size).order_by('pk')
+
+
+def shard_entries(section, shard):
+    """
+    Yields the (path, lastmod) pairs of the rows in ``shard`` of
+    ``section``, read with one range query over the primary key.
+    """
+    return SECTIONS[section][1](shard_queryset(section, shard))
@@ -0,0 +1,89 @@
+import re
+
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+
+# Names whose taken slugs are looked up per query, which keeps the regular
+# expression a reasonable size.
+CHUNK_SIZE = 500
+
+# Room for a -N suffix of up to 7 digits.
+SUFFIX_ROOM = 8
+
+# Times a save allocates a slug again after a concurrent save took it.
+SAVE_ATTEMPTS = 3
+
+
+def slug_base(name, max_length, default):
+    return slugify(unicode(name))[:max_length].strip('-') or default
+
+
+def slug_pattern(base, max_length):
+    pattern = r'%s(-[0-9]+)?' % re.escape(base)
+    if len(base) + SUFFIX_ROOM > max_length:
+        # A long enough suffix cuts into a base this long, so match the
+        # suffixed slugs by the part of it no suffix reaches.
+        pattern += r'|%s.*-[0-9]+' % re.escape(base[:max_length - SUFFIX_ROOM])
+    return pattern
+
+
+def taken_slugs(model, bases, max_length, exclude_pk=None):
+    """
+    Returns the slugs of ``model`` equal to one of ``bases``, or to one of
+    them with a -N suffix that was cut to fit ``max_length``.
+    """
+    bases = sorted(set(bases))
+    queryset = model._default_manager.all()
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    taken = set()
+    for start in range(0, len(bases), CHUNK_SIZE):
+        pattern = r'^(%s)$' % '|'.join(slug_pattern(base, max_length) for base in bases[start:start + CHUNK_SIZE])
+        taken.update(queryset.filter(slug__regex=pattern).values_list('slug', flat=True))
+    return taken
+
+
+def allocate_slugs(model, names, exclude_pk=None):
+    """
+    Returns a slug for each of ``names``, unique among them and among the
+    slugs of ``model`` but that of ``exclude_pk``. Taken slugs get a -2,
+    -3... suffix. Needs one query per CHUNK_SIZE names.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [slug_base(name, max_length, model._meta.model_name) for name in names]
+    if not bases:
+        return []
+    taken = taken_slugs(model, bases, max_length, exclude_pk)
+    slugs = []
+    for base in bases:
+        slug, n = base, 1
+        while slug in taken:
+            n += 1
+            suffix = '-%d' % n
+            slug = base[:max_length - len(suffix)] + suffix
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(instance, name):
+    return allocate_slugs(type(instance), [name], exclude_pk=instance.pk)[0]
+
+
+def save_with_slug(instance, name, save):
+    """
+    Calls ``save`` once ``instance`` has a slug, allocated from ``name``
+    if it had none. A concurrent save can take the same slug first, which
+    the unique index rejects; the slug is then allocated again.
+    """
+    if instance.slug:
+        return save()
+    for attempt in range(SAVE_ATTEMPTS):
+        instance.slug = allocate_slug(instance, name)
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            taken = type(instance)._default_manager.filter(slug=instance.slug).exclude(pk=instance.pk)
+            if attempt == SAVE_ATTEMPTS - 1 or not taken.exists():
+                raise
@@ -0,0 +1,31 @@
+from django.utils import timezone
+
+# The times the posts, and the categories, tags and flatpages shown
+# around them, last changed. The views' conditional GET validators read
+# these instead of aggregating the posts table.
+POSTS_STAMP = 'posts'
+CHROME_STAMP = 'chrome'
+
+
+def get_stamps(*names):
+    stamps = dict(ChangeStamp.objects.filter(name__in=names).values_list('name', 'modified'))
+    for name in names:
+        if name not in stamps:
+            # A stamp nothing touched yet starts from now, which only
+            # costs clients one full response.
+            stamp, created = ChangeStamp.objects.get_or_create(
+                name=name, defaults={'modified': timezone.now()})
+            stamps[name] = stamp.modified
+    return [stamps[name] for name in names]
+
+
+def touch_stamps(*names):
+    now = timezone.now()
+    for name in names:
+        if not ChangeStamp.objects.filter(name=name).update(modified=now):
+            ChangeStamp.objects.get_or_create(name=name, defaults={'modified': now})
+
+
+# Imported last: the models connect blogengine.signals, which uses the
+# functions above.
+from blogengine.models import ChangeStamp
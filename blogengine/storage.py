@@ -0,0 +1,138 @@
+import gzip
+import io
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import CachedStaticFilesStorage, StaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.xml', '.json', '.map', '.eot', '.ttf', '.ico')
+
+# Smaller files fit in a packet or two anyway.
+COMPRESS_MIN_SIZE = 256
+
+CSS_URL = re.compile(r"""url\(\s*(['"]?)\s*(.*?)\s*\1\s*\)""", re.IGNORECASE)
+
+
+def rebase_css_urls(content, source, bundle):
+    """
+    Rewrites the relative url()s of the stylesheet ``source`` so that they
+    still point at the same files from ``bundle``.
+    """
+    def rebase(match):
+        quote, url = match.groups()
+        if not url or url.startswith(('#', '/', 'data:', 'http:', 'https:')):
+            return match.group(0)
+        path, sep, rest = url.partition('?') if '?' in url else url.partition('#')
+        target = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        rebased = posixpath.relpath(target, posixpath.dirname(bundle) or '.')
+        return 'url(%s%s%s%s%s)' % (quote, rebased, sep, rest, quote)
+    return CSS_URL.sub(rebase, content)
+
+
+def build_bundle(name, sources, read):
+    """
+    Concatenates the ``sources`` of the bundle ``name``, minified when
+    rcssmin or rjsmin are installed. ``read`` returns a source's text.
+    """
+    parts = []
+    for source in sources:
+        content = read(source)
+        if name.endswith('.css'):
+            content = rebase_css_urls(content, source, name)
+            if rcssmin is not None:
+                content = rcssmin.cssmin(content)
+        elif name.endswith('.js') and rjsmin is not None:
+            content = rjsmin.jsmin(content)
+        parts.append(content.strip())
+    # Scripts without a trailing semicolon must not run into the next one.
+    separator = ';\n' if name.endswith('.js') else '\n'
+    return separator.join(parts) + '\n'
+
+
+def compressed_variants(content):
+    """
+    Returns (suffix, bytes) for the precompressed variants of ``content``
+    that are actually smaller than it.
+    """
+    variants = []
+    buf = io.BytesIO()
+    # A fixed mtime keeps the output identical between deploys.
+    with gzip.GzipFile(filename='', mode='wb', fileobj=buf, compresslevel=9, mtime=0) as gz:
+        gz.write(content)
+    variants.append(('.gz', buf.getvalue()))
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(content)))
+    return [(suffix, data) for suffix, data in variants if len(data) < len(content)]
+
+
+class BundledStaticFilesStorage(CachedStaticFilesStorage):
+    """
+    Builds the STATIC_BUNDLES, fingerprints every file like
+    CachedStaticFilesStorage and writes .gz and .br variants of the hashed
+    text files for blogengine.wsgi.StaticFilesHandler to serve.
+    """
+
+    def url(self, name, force=False):
+        try:
+            return super(BundledStaticFilesStorage, self).url(name, force)
+        except ValueError:
+            # Not collected, e.g. running the tests: link the plain name
+            # rather than failing the whole page.
+            return StaticFilesStorage.url(self, name)
+
+    def build_bundles(self, paths):
+        def read(source):
+            if source not in paths:
+                raise ValueError("The bundled file '%s' was not collected." % source)
+            storage, path = paths[source]
+            with storage.open(path) as f:
+                return f.read().decode(settings.FILE_CHARSET)
+
+        for name, sources in getattr(settings, 'STATIC_BUNDLES', {}).items():
+            content = build_bundle(name, sources, read)
+            if self.exists(name):
+                self.delete(name)
+            self._save(name, ContentFile(content.encode('utf-8')))
+            paths[name] = (self, name)
+            yield name
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+            return
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+        for suffix, data in compressed_variants(content):
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(data))
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+        for name in self.build_bundles(paths):
+            yield name, name, True
+        processed = super(BundledStaticFilesStorage, self).post_process(paths, dry_run, **options)
+        for name, hashed_name, was_processed in processed:
+            if hashed_name and not isinstance(was_processed, Exception):
+                self.compress(hashed_name)
+            yield name, hashed_name, was_processed
@@ -0,0 +1,49 @@
+import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.utils import formats
+from django.utils.text import capfirst
+from django.utils.translation import ugettext as _
+
+from blogengine.models import MonthArchive
+
+register = template.Library()
+
+
+@register.inclusion_tag('admin/date_hierarchy.html')
+def month_archive_hierarchy(cl):
+    """
+    The admin's date_hierarchy with the years and months listed from
+    MonthArchive, where Django groups every post. Days, and changelists
+    narrowed by a search or filter, are left to Django.
+    """
+    field_name = cl.date_hierarchy
+    year_field, month_field = '%s__year' % field_name, '%s__month' % field_name
+    params = cl.get_filters_params()
+    if cl.query or set(params) - set([year_field]):
+        return date_hierarchy(cl)
+
+    link = lambda d: cl.get_query_string(d, ['%s__' % field_name])
+    months = list(MonthArchive.objects.order_by('year', 'month').values_list('year', 'month'))
+    years = sorted(set(year for year, month in months))
+    year = params.get(year_field)
+    if year is None:
+        if len(months) == 1:
+            # Django starts from the days of a single month.
+            return date_hierarchy(cl)
+        if len(years) != 1:
+            return {
+                'show': True,
+                'choices': [{'link': link({year_field: str(choice)}), 'title': str(choice)} for choice in years],
+            }
+        year = years[0]
+    year = int(year)
+    return {
+        'show': True,
+        'back': {'link': link({}), 'title': _('All dates')},
+        'choices': [{
+            'link': link({year_field: year, month_field: month}),
+            'title': capfirst(formats.date_format(datetime.date(year, month, 1), 'YEAR_MONTH_FORMAT')),
+        } for archive_year, month in months if archive_year == year],
+    }
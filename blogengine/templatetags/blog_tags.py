@@ -0,0 +1,64 @@
+import math
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.html import format_html_join
+
+from blogengine.cache import CATEGORY_LIST_CACHE_KEY, MONTH_LIST_CACHE_KEY, TAG_CLOUD_CACHE_KEY, get_sidebar
+from blogengine.models import Category, MonthArchive, Tag
+
+register = template.Library()
+
+TAG_CLOUD_WEIGHTS = 5
+
+
+def build_tag_cloud():
+    tags = list(Tag.objects.filter(post_count__gt=0).order_by('name'))
+    if not tags:
+        return []
+    # Weights grow with the log of the count, so a few busy tags do not
+    # flatten the rest of the cloud to the smallest size.
+    low = math.log(min(tag.post_count for tag in tags))
+    spread = math.log(max(tag.post_count for tag in tags)) - low
+    for tag in tags:
+        scaled = (math.log(tag.post_count) - low) / spread if spread else 0
+        tag.weight = 1 + int(round(scaled * (TAG_CLOUD_WEIGHTS - 1)))
+    return tags
+
+
+def build_category_list():
+    return list(Category.objects.filter(post_count__gt=0).order_by('name'))
+
+
+def build_month_list():
+    return list(MonthArchive.objects.all())
+
+
+@register.inclusion_tag('blogengine/includes/tag_cloud.html')
+def tag_cloud():
+    return {'tags': get_sidebar(TAG_CLOUD_CACHE_KEY, build_tag_cloud)}
+
+
+@register.inclusion_tag('blogengine/includes/category_list.html')
+def category_list():
+    return {'categories': get_sidebar(CATEGORY_LIST_CACHE_KEY, build_category_list)}
+
+
+@register.inclusion_tag('blogengine/includes/month_list.html')
+def month_list():
+    return {'months': get_sidebar(MONTH_LIST_CACHE_KEY, build_month_list)}
+
+
+@register.simple_tag
+def static_bundle(name):
+    """
+    Links the STATIC_BUNDLES bundle ``name``, or in DEBUG the files it is
+    built from, which collectstatic has not bundled.
+    """
+    files = settings.STATIC_BUNDLES[name] if settings.DEBUG else [name]
+    if name.endswith('.css'):
+        markup = '<link rel="stylesheet" href="{0}">'
+    else:
+        markup = '<script src="{0}"></script>'
+    return format_html_join('\n', markup, ((staticfiles_storage.url(path),) for path in files))
@@ -1,18 +1,14 @@
 from django import template
 from django.template.defaultfilters import stringfilter
-from django.utils.encoding import force_unicode
 from django.utils.safestring import mark_safe
 
-import markdown
+from blogengine.markup import render_markdown_cached
+from blogengine.performance import timed
 
 register = template.Library()
 
 @register.filter(is_safe=True)
 @stringfilter
 def custom_markdown(value):
-    extensions = ["nl2br", ]
-
-    return mark_safe(markdown.markdown(force_unicode(value),
-                                       extensions,
-                                       safe_mode=True,
-                                       enable_attributes=False))
+    with timed('markdown'):
+        return mark_safe(render_markdown_cached(value))
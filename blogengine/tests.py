@@ -1,9 +1,43 @@
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.flatpages.models import FlatPage
 from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command
+from django.core.urlresolvers import resolve
+from django.template import Context, Template
+from django.db import connection
 from django.test import TestCase, LiveServerTestCase, Client
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils import timezone
-from blogengine.models import Post
+from datetime import datetime, timedelta
+from blogengine.markup import RenderCache, render_cache
+from blogengine.pagination import EstimatedCountPaginator, EstimatedCountQuerySet, estimated_count, iter_keyset
+from blogengine.admin import PostAdminForm
+from blogengine.benchmark import seed_corpus
+from blogengine.cache import FEED_CACHE_KEY, chrome_cache_timeout, get_page_cache
+from blogengine.counts import recount_categories
+from blogengine.importer import PostImporter
+from blogengine.db.pool import ConnectionPool, PoolExhausted
+from blogengine.management.commands import export_corpus
+from blogengine.management.commands.benchmark_views import summarize
+from blogengine.performance import histogram
+import blogengine.slugs
+from blogengine.slugs import allocate_slugs
+from blogengine.storage import BundledStaticFilesStorage, rebase_css_urls
+from blogengine.wsgi import StaticFilesHandler
+from blogengine.models import Category, MonthArchive, Post, SearchTerm, Tag
+from blogengine.templatetags.custom_markdown import custom_markdown
+import gzip
+import json
 import markdown
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from StringIO import StringIO
 # Create your tests here.
 
 class PostTest(TestCase):
@@ -38,6 +72,1681 @@ class PostTest(TestCase):
         self.assertEquals(only_post.author.username, 'testuser')
         self.assertEquals(only_post.author.email, 'user@example.com')
 
+class PostRenderTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+
+    def create_post(self, text):
+        post = Post()
+        post.title = 'My first post'
+        post.text = text
+        post.slug = 'my-first-post'
+        post.pub_date = timezone.now()
+        post.author = self.author
+        post.site = Site.objects.get_current()
+        post.save()
+        return post
+
+    def test_save_renders_text(self):
+        post = self.create_post('This is *my* first blog post')
+
+        only_post = Post.objects.get(pk=post.pk)
+        self.assertEquals(only_post.rendered_text, '<p>This is <em>my</em> first blog post</p>')
+        self.assertEquals(len(only_post.text_hash), 40)
+
+    def test_edit_rerenders_text(self):
+        post = self.create_post('This is *my* first blog post')
+        old_hash = post.text_hash
+
+        post.text = 'This is **my** second blog post'
+        post.save()
+
+        only_post = Post.objects.get(pk=post.pk)
+        self.assertEquals(only_post.rendered_text, '<p>This is <strong>my</strong> second blog post</p>')
+        self.assertNotEquals(only_post.text_hash, old_hash)
+
+    def test_render_posts_command(self):
+        post = self.create_post('This is *my* first blog post')
+        Post.objects.filter(pk=post.pk).update(rendered_text='', text_hash='')
+
+        call_command('render_posts')
+
+        only_post = Post.objects.get(pk=post.pk)
+        self.assertEquals(only_post.rendered_text, '<p>This is <em>my</em> first blog post</p>')
+        self.assertEquals(only_post.text_hash, post.text_hash)
+
+class RenderCacheTest(TestCase):
+    def test_lru_eviction(self):
+        cache = RenderCache(max_entries=2, max_bytes=1024)
+        cache.set('a', u'<p>a</p>')
+        cache.set('b', u'<p>b</p>')
+        self.assertEquals(cache.get('a'), u'<p>a</p>')
+
+        cache.set('c', u'<p>c</p>')
+
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('a'), u'<p>a</p>')
+        self.assertEquals(cache.get('c'), u'<p>c</p>')
+        info = cache.info()
+        self.assertEquals(info['entries'], 2)
+        self.assertEquals(info['evictions'], 1)
+        self.assertEquals(info['hits'], 3)
+        self.assertEquals(info['misses'], 1)
+
+    def test_memory_cap(self):
+        cache = RenderCache(max_entries=100, max_bytes=40)
+        cache.set('a', u'x' * 15)
+        cache.set('b', u'y' * 15)
+        self.assertEquals(cache.get('a'), None)
+        self.assertEquals(cache.info()['bytes'], 30)
+
+        cache.set('c', u'z' * 50)
+        self.assertEquals(cache.get('c'), None)
+
+    def test_filter_uses_cache(self):
+        render_cache.clear()
+        first = custom_markdown('All *about* me')
+        second = custom_markdown('All *about* me')
+
+        self.assertEquals(first, second)
+        self.assertEquals(render_cache.info()['misses'], 1)
+        self.assertEquals(render_cache.info()['hits'], 1)
+
+class BudgetAssertionsMixin(object):
+    """
+    Pins the number of SQL queries and a rough render time ceiling of a
+    page. Caches are warmed by a first request, so the budgets hold for
+    every later visitor; list the views under BLOG_PAGE_CACHE=False.
+    """
+    RENDER_CEILING_MS = 500
+
+    def assertBudget(self, url, queries, ms=None, warm=True):
+        if warm:
+            # Read streamed responses to the end, like a WSGI server.
+            b''.join(self.client.get(url))
+        with CaptureQueriesContext(connection) as captured:
+            start = time.time()
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response)
+            elapsed = (time.time() - start) * 1000
+        self.assertEquals(response.status_code, 200, '%s returned %d' % (url, response.status_code))
+        self.assertTrue(len(captured) <= queries, '%s ran %d queries, budget is %d:\n%s' % (
+            url, len(captured), queries, '\n'.join(query['sql'] for query in captured)))
+        ceiling = self.RENDER_CEILING_MS if ms is None else ms
+        self.assertTrue(elapsed <= ceiling, '%s took %.0fms, ceiling is %dms' % (url, elapsed, ceiling))
+        return response
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class ListQueryBudgetTest(BudgetAssertionsMixin, TestCase):
+    # posts + prefetched tags + nav flatpages + category list, tag cloud
+    # and month list, measured with cold caches, + the change stamps;
+    # taxonomy pages add their conditional GET validators.
+    INDEX_BUDGET = 7
+    TAXONOMY_BUDGET = 8
+
+    def setUp(self):
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        category = Category(name='python', description='Python')
+        category.save()
+        tags = [Tag(name='django', description='Django'),
+                Tag(name='perf', description='Performance')]
+        for tag in tags:
+            tag.save()
+        for i in range(6):
+            post = Post.objects.create(
+                title='Post %d' % i,
+                text='Post *number* %d' % i,
+                slug='post-%d' % i,
+                pub_date=timezone.now(),
+                author=author,
+                site=Site.objects.get_current(),
+                category=category,
+            )
+            post.tags.add(*tags)
+
+    def assertColdBudget(self, url, queries):
+        # What the first visitor after a change pays.
+        cache.clear()
+        return self.assertBudget(url, queries, warm=False)
+
+    def test_index(self):
+        self.assertColdBudget('/', self.INDEX_BUDGET)
+        self.assertColdBudget('/2/', self.INDEX_BUDGET)
+
+    def test_category(self):
+        self.assertColdBudget('/category/python/', self.TAXONOMY_BUDGET)
+
+    def test_tag(self):
+        self.assertColdBudget('/tag/django/', self.TAXONOMY_BUDGET)
+
+    def test_taxonomy_context(self):
+        response = self.client.get('/category/python/')
+        self.assertEquals(response.context['category'].name, 'python')
+        self.assertTrue('Category: python' in response.content)
+
+        response = self.client.get('/tag/perf/')
+        self.assertEquals(response.context['tag'].name, 'perf')
+        self.assertTrue('Tag: perf' in response.content)
+
+    def test_taxonomy_pages(self):
+        response = self.client.get('/category/python/')
+        self.assertTrue('href="/category/python/page/2/"' in response.content)
+        response = self.client.get('/category/python/page/2/')
+        self.assertEquals(len(response.context['object_list']), 1)
+        self.assertTrue('href="/category/python/page/1/"' in response.content)
+        response = self.client.get('/tag/django/page/2/')
+        self.assertEquals(len(response.context['object_list']), 1)
+
+    def test_unknown_slug(self):
+        self.assertEquals(self.client.get('/category/missing/').status_code, 404)
+        self.assertEquals(self.client.get('/tag/missing/').status_code, 404)
+
+    def test_empty_taxonomy(self):
+        Category(name='empty', description='No posts').save()
+        Tag(name='unused', description='No posts').save()
+        response = self.client.get('/category/empty/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.context['category'].name, 'empty')
+        self.assertFalse(response.context['object_list'])
+
+        response = self.client.get('/tag/unused/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.context['tag'].name, 'unused')
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class PostCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        self.python = Category(name='python', description='Python')
+        self.python.save()
+        self.perl = Category(name='perl', description='Perl')
+        self.perl.save()
+        self.django = Tag(name='django', description='Django')
+        self.django.save()
+        self.perf = Tag(name='perf', description='Performance')
+        self.perf.save()
+
+    def create_post(self, slug, category):
+        return Post.objects.create(title=slug, text='Text', slug=slug, pub_date=timezone.now(),
+                                   author=self.author, site=Site.objects.get_current(),
+                                   category=category)
+
+    def counts(self):
+        return (dict(Category.objects.values_list('name', 'post_count')),
+                dict(Tag.objects.values_list('name', 'post_count')))
+
+    def test_counts_follow_posts(self):
+        first = self.create_post('first', self.python)
+        second = self.create_post('second', self.python)
+        first.tags.add(self.django, self.perf)
+        second.tags.add(self.django)
+        self.assertEquals(self.counts(), ({'python': 2, 'perl': 0}, {'django': 2, 'perf': 1}))
+
+        second.category = self.perl
+        second.save()
+        first.tags.remove(self.perf, self.perf)
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 1}, {'django': 2, 'perf': 0}))
+
+        self.perf.post_set.add(second)
+        first.tags.clear()
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 1}, {'django': 1, 'perf': 1}))
+
+        second.delete()
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 0}, {'django': 0, 'perf': 0}))
+
+    def test_taxonomy_save_keeps_counts(self):
+        python = Category.objects.get(pk=self.python.pk)
+        django = Tag.objects.get(pk=self.django.pk)
+        self.create_post('first', self.python).tags.add(self.django)
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 0}, {'django': 1, 'perf': 0}))
+
+        python.description = 'The Python language'
+        python.save()
+        django.description = 'The Django framework'
+        django.save()
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 0}, {'django': 1, 'perf': 0}))
+
+    def test_recount_command(self):
+        post = self.create_post('first', self.python)
+        post.tags.add(self.django)
+        Category.objects.update(post_count=7)
+        Tag.objects.update(post_count=7)
+        call_command('recount_posts', stdout=StringIO())
+        self.assertEquals(self.counts(), ({'python': 1, 'perl': 0}, {'django': 1, 'perf': 0}))
+
+    def test_sidebar_is_cached(self):
+        for i in range(4):
+            self.create_post('post-%d' % i, self.python).tags.add(self.django)
+        self.create_post('other', self.python).tags.add(self.perf)
+        template = Template('{% load blog_tags %}{% tag_cloud %}{% category_list %}')
+        content = template.render(Context())
+        self.assertTrue('tag-weight-5' in content and 'tag-weight-1' in content)
+        self.assertTrue('perl' not in content)
+        with self.assertNumQueries(0):
+            template.render(Context())
+
+        self.create_post('more', self.perl)
+        self.assertTrue('perl' in template.render(Context()))
+
+
+class DateArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        for slug, year, month, day in [('first', 2013, 12, 31), ('second', 2014, 1, 5),
+                                       ('third', 2014, 1, 5), ('fourth', 2014, 3, 1)]:
+            self.create_post(slug, year, month, day)
+
+    def create_post(self, slug, year, month, day):
+        return Post.objects.create(title=slug, text='Text', slug=slug,
+                                   pub_date=timezone.make_aware(datetime(year, month, day, 12),
+                                                                timezone.utc),
+                                   author=self.author, site=Site.objects.get_current())
+
+    def months(self):
+        return list(MonthArchive.objects.values_list('year', 'month', 'post_count'))
+
+    def test_month_archive_follows_posts(self):
+        self.assertEquals(self.months(), [(2014, 3, 1), (2014, 1, 2), (2013, 12, 1)])
+        post = Post.objects.get(slug='fourth')
+        post.pub_date = post.pub_date.replace(month=1)
+        post.save()
+        self.assertEquals(self.months(), [(2014, 1, 3), (2013, 12, 1)])
+        Post.objects.get(slug='first').delete()
+        self.assertEquals(self.months(), [(2014, 1, 3)])
+
+        MonthArchive.objects.all().delete()
+        call_command('recount_posts', stdout=StringIO())
+        self.assertEquals(self.months(), [(2014, 1, 3)])
+
+    def test_archive_pages(self):
+        response = self.client.get('/archive/2014/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals([post.slug for post in response.context['object_list']],
+                          ['fourth', 'third', 'second'])
+        self.assertEquals(response.context['previous_year'].year, 2013)
+        self.assertEquals(response.context['next_year'], None)
+
+        response = self.client.get('/archive/2014/1/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.context['object_list']), 2)
+        self.assertTrue('Archive: January 2014' in response.content)
+        self.assertEquals(response.context['previous_month'].month, 12)
+        self.assertEquals(response.context['next_month'].month, 3)
+
+        response = self.client.get('/archive/2014/01/05/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.context['object_list']), 2)
+
+        for url in ('/archive/2015/', '/archive/2014/2/', '/archive/2014/13/', '/archive/2014/1/6/',
+                    '/archive/2014/2/30/'):
+            self.assertEquals(self.client.get(url).status_code, 404, url)
+
+    def test_archive_pagination(self):
+        for i in range(4):
+            self.create_post('more-%d' % i, 2014, 1, 10 + i)
+        response = self.client.get('/archive/2014/1/')
+        self.assertTrue('href="/archive/2014/1/page/2/"' in response.content)
+        response = self.client.get('/archive/2014/1/page/2/')
+        self.assertEquals([post.slug for post in response.context['object_list']], ['second'])
+        self.assertTrue('href="/archive/2014/1/page/1/"' in response.content)
+
+    def test_years_do_not_shadow_index_pages(self):
+        self.assertEquals(resolve('/2014/').func.__name__, 'PostIndexView')
+        self.assertEquals(resolve('/archive/2014/').func.__name__, 'PostYearArchiveView')
+
+    def test_month_list(self):
+        template = Template('{% load blog_tags %}{% month_list %}')
+        content = template.render(Context())
+        self.assertTrue('href="/archive/2014/1/">January 2014</a> <span class="badge">2</span>' in content)
+        with self.assertNumQueries(0):
+            template.render(Context())
+        self.create_post('fifth', 2014, 4, 1)
+        self.assertTrue('April 2014' in template.render(Context()))
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class PerformanceMiddlewareTest(TestCase):
+    def setUp(self):
+        histogram.__init__(window=300)
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        for i in range(3):
+            Post.objects.create(title='Post %d' % i, text='Post *number* %d' % i, slug='post-%d' % i,
+                                pub_date=timezone.now(), author=self.author,
+                                site=Site.objects.get_current())
+        Post.objects.update(rendered_text='')
+
+    def test_server_timing(self):
+        response = self.client.get('/')
+        timing = dict(metric.split(';', 1) for metric in response['Server-Timing'].split(', '))
+        self.assertEquals(sorted(timing), ['db', 'markdown', 'template', 'total'])
+        queries = int(timing['db'].split('desc="')[1].split()[0])
+        self.assertTrue(queries > 0)
+        self.assertTrue(float(timing['markdown'].split('=')[1]) > 0)
+        self.assertEquals(connection.queries, [])
+
+    def test_histogram(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.client.get('/feeds/posts/')
+        stats = histogram.snapshot()
+        self.assertEquals(stats['blogengine.views.PostIndexView']['count'], 2)
+        self.assertEquals(stats['blogengine.views.PostsFeed']['count'], 1)
+        self.assertTrue(stats['blogengine.views.PostIndexView']['p95_wall_ms'] > 0)
+
+    def test_histogram_window(self):
+        metrics = dict(wall_ms=12.0, queries=3, sql_ms=1.0, template_ms=2.0, markdown_ms=0.5)
+        histogram.record('old', metrics, now=1000)
+        histogram.record('new', metrics, now=1250)
+        self.assertEquals(sorted(histogram.snapshot(now=1280)), ['new', 'old'])
+        self.assertEquals(sorted(histogram.snapshot(now=1310)), ['new'])
+        self.assertEquals(histogram.snapshot(now=1310)['new']['p50_wall_ms'], 12.0)
+
+    def test_dump(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with override_settings(BLOG_PERFORMANCE_DUMP_FILE=os.path.join(directory, 'perf-%(pid)s.json'),
+                                   BLOG_PERFORMANCE_DUMP_INTERVAL=0):
+                self.client.get('/')
+            with open(os.path.join(directory, 'perf-%d.json' % os.getpid())) as f:
+                self.assertTrue('blogengine.views.PostIndexView' in json.load(f)['patterns'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_staff_endpoint(self):
+        self.client.get('/')
+        # Anonymous visitors get the admin login form.
+        response = self.client.get('/admin/performance/')
+        self.assertFalse('PostIndexView' in response.content)
+        self.author.is_staff = True
+        self.author.save()
+        self.client.login(username='testuser', password='password')
+        response = self.client.get('/admin/performance/')
+        self.assertEquals(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertTrue('blogengine.views.PostIndexView' in data['patterns'])
+        self.assertEquals(sorted(data['markdown_cache']), ['bytes', 'entries', 'evictions', 'hits',
+                                                           'max_bytes', 'max_entries', 'misses'])
+
+
+class BenchmarkTest(TestCase):
+    def test_seed_corpus(self):
+        seed_corpus(posts=20, categories=3, tags=5, tags_per_post=2, batch_size=8,
+                    markdown=True, flatpages=2)
+        self.assertEquals(Post.objects.count(), 20)
+        self.assertFalse(Post.objects.filter(rendered_text='').exists())
+        self.assertTrue('<h2>' in Post.objects.all()[0].rendered_text)
+        self.assertEquals(sum(Category.objects.values_list('post_count', flat=True)), 20)
+        self.assertEquals(sum(Tag.objects.values_list('post_count', flat=True)), 40)
+        self.assertEquals(sum(MonthArchive.objects.values_list('post_count', flat=True)), 20)
+        self.assertEquals(FlatPage.objects.filter(url__startswith='/bench-page-').count(), 2)
+
+    def test_summarize(self):
+        stats = summarize([float(ms) for ms in range(100, 0, -1)], elapsed=2.0, errors=1)
+        self.assertEquals(stats['rps'], 50.0)
+        self.assertEquals((stats['p50_ms'], stats['p90_ms'], stats['p99_ms'], stats['max_ms']),
+                          (50.0, 90.0, 99.0, 100.0))
+        self.assertEquals(stats['errors'], 1)
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class PublicURLBudgetTest(BudgetAssertionsMixin, TestCase):
+    # Query budgets per URL with warm caches. They must not grow with the
+    # corpus: a query per post or per tag on the page is an N+1.
+    BUDGETS = [
+        # posts + prefetched tags + change stamps
+        ('/', 3),
+        ('/1/', 3),
+        # post + prefetched tags + change stamps + validators
+        ('detail', 4),
+        # posts + prefetched tags + change stamps + validators
+        ('category', 4),
+        ('tag', 4),
+        # posts exist + posts + prefetched tags + change stamps + validators
+        # + previous and next day, month or year
+        ('year', 7),
+        ('month', 7),
+        # and the previous and next month
+        ('day', 9),
+        # ranked ids + posts + prefetched tags + count
+        ('/search/?q=django', 4),
+        # cached XML
+        ('/feeds/posts/', 0),
+        # flatpage
+        ('/bench-page-0/', 1),
+        # the shards of each section
+        ('/sitemap.xml', 4),
+        # a primary key range of posts, and of categories with their
+        # latest post
+        ('/sitemap-posts-1.xml', 1),
+        ('/sitemap-categories-1.xml', 1),
+    ]
+
+    def check_budgets(self, posts):
+        seed_corpus(posts=posts, categories=3, tags=8, markdown=True, flatpages=1)
+        call_command('rebuild_search_index', stdout=StringIO())
+        post = Post.objects.order_by('pub_date')[posts // 2]
+        pub_date = timezone.localtime(post.pub_date)
+        urls = {
+            'detail': post.get_absolute_url(),
+            'category': post.category.get_absolute_url(),
+            'tag': post.tags.all()[0].get_absolute_url(),
+            'year': '/archive/%d/' % pub_date.year,
+            'month': '/archive/%d/%d/' % (pub_date.year, pub_date.month),
+            'day': '/archive/%d/%d/%d/' % (pub_date.year, pub_date.month, pub_date.day),
+        }
+        for url, queries in self.BUDGETS:
+            self.assertBudget(urls.get(url, url), queries)
+
+    def test_small_corpus(self):
+        self.check_budgets(3)
+
+    def test_medium_corpus(self):
+        self.check_budgets(30)
+
+    def test_large_corpus(self):
+        self.check_budgets(200)
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.pool = ConnectionPool(FakeConnection, max_size=2, max_idle=1, max_lifetime=60,
+                                   health_check_interval=10, timeout=0.01,
+                                   check=lambda connection: connection.alive,
+                                   clock=lambda: self.now)
+
+    def test_reuse(self):
+        first = self.pool.acquire()
+        self.pool.release(first)
+        self.assertTrue(self.pool.acquire() is first)
+        self.assertEquals(first.rollbacks, 1)
+        stats = self.pool.stats()
+        self.assertEquals((stats['open'], stats['idle'], stats['in_use']), (1, 0, 1))
+        self.assertEquals((stats['connects'], stats['reuses']), (1, 1))
+
+    def test_max_idle_and_size(self):
+        first, second = self.pool.acquire(), self.pool.acquire()
+        self.assertRaises(PoolExhausted, self.pool.acquire)
+        self.pool.release(first)
+        self.pool.release(second)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+        stats = self.pool.stats()
+        self.assertEquals((stats['open'], stats['idle'], stats['timeouts']), (1, 1, 1))
+
+    def test_health_check(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        connection.alive = False
+        self.now += 5
+        self.assertTrue(self.pool.acquire() is connection)
+        self.pool.release(connection)
+        self.now += 10
+        self.assertFalse(self.pool.acquire() is connection)
+        self.assertTrue(connection.closed)
+        self.assertEquals(self.pool.stats()['health_check_failures'], 1)
+
+    def test_max_lifetime(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection)
+        self.now += 61
+        self.assertFalse(self.pool.acquire() is connection)
+        self.assertTrue(connection.closed)
+        self.assertEquals(self.pool.stats()['recycled'], 1)
+
+        connection = self.pool.acquire()
+        self.now += 61
+        self.pool.release(connection)
+        self.assertTrue(connection.closed)
+        self.assertEquals(self.pool.stats()['idle'], 0)
+
+    def test_discard(self):
+        connection = self.pool.acquire()
+        self.pool.release(connection, discard=True)
+        self.assertTrue(connection.closed)
+        self.assertEquals(connection.rollbacks, 0)
+        self.assertEquals(self.pool.stats()['open'], 0)
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class FragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.page = FlatPage(url='/about/', title='About me', content='All about me')
+        self.page.save()
+        self.page.sites.add(Site.objects.get_current())
+
+    def test_nav_is_cached(self):
+        self.assertTrue('About me' in self.client.get('/').content)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+        self.assertFalse([query for query in queries if 'django_flatpage' in query['sql']])
+
+    def test_flatpage_save_purges_nav(self):
+        self.client.get('/')
+        self.page.title = 'About us'
+        self.page.save()
+        self.assertTrue('About us' in self.client.get('/').content)
+
+        contact = FlatPage(url='/contact/', title='Contact', content='Write to me')
+        contact.save()
+        contact.sites.add(Site.objects.get_current())
+        self.assertTrue('Contact' in self.client.get('/').content)
+
+    def test_chrome_expires_after_its_timeout(self):
+        # Other processes are not purged by a save; the timeout bounds how
+        # long they show the old navigation and sidebar.
+        self.assertEquals(chrome_cache_timeout(), 60)
+        with override_settings(BLOG_CHROME_CACHE_TIMEOUT=0):
+            self.client.get('/')
+            FlatPage.objects.filter(pk=self.page.pk).update(title='About us')
+            self.assertTrue('About us' in self.client.get('/').content)
+
+    def test_static_links_vary_on_static_version(self):
+        cache.set(make_template_fragment_key('blog_static_head', ['1']), '<!-- old links -->')
+        with override_settings(BLOG_STATIC_VERSION='1'):
+            self.assertTrue('<!-- old links -->' in self.client.get('/').content)
+        with override_settings(BLOG_STATIC_VERSION='2'):
+            content = self.client.get('/').content
+        self.assertFalse('<!-- old links -->' in content)
+        self.assertTrue('bundles/site.css' in content)
+
+
+class StaticAssetsTest(TestCase):
+    bundles = {
+        'bundles/site.css': ('vendor/lib/css/lib.css', 'css/main.css'),
+        'bundles/site.js': ('js/one.js', 'js/two.js'),
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name, content):
+        path = os.path.join(self.root, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.root, *name.split('/')), 'rb') as f:
+            return f.read()
+
+    def test_rebase_css_urls(self):
+        css = ('a { background: url(../img/a.png) } b { background: url("data:image/png;base64,AA") } '
+               "@font-face { src: url('../fonts/f.eot?#iefix') } c { background: url(/img/c.png) }")
+        rebased = rebase_css_urls(css, 'vendor/lib/css/lib.css', 'bundles/site.css')
+        self.assertTrue('url(../vendor/lib/img/a.png)' in rebased)
+        self.assertTrue('url("data:image/png;base64,AA")' in rebased)
+        self.assertTrue("url('../vendor/lib/fonts/f.eot?#iefix')" in rebased)
+        self.assertTrue('url(/img/c.png)' in rebased)
+
+    def test_collect_builds_hashed_compressed_bundles(self):
+        # Sources as collectstatic leaves them, before post processing.
+        self.write('vendor/lib/css/lib.css', '.lib { background: url(../img/bg.png) }\n' * 20)
+        self.write('vendor/lib/img/bg.png', '\x89PNG')
+        self.write('css/main.css', 'body { color: black }\n')
+        self.write('js/one.js', 'var one = 1\n')
+        self.write('js/two.js', 'var two = 2\n' * 50)
+        storage = BundledStaticFilesStorage(location=self.root, base_url='/static/')
+        names = ['vendor/lib/css/lib.css', 'vendor/lib/img/bg.png', 'css/main.css', 'js/one.js', 'js/two.js']
+        with override_settings(STATIC_BUNDLES=self.bundles):
+            processed = list(storage.post_process(dict((name, (storage, name)) for name in names)))
+        self.assertFalse([result for result in processed if isinstance(result[2], Exception)])
+
+        css_url = storage.url('bundles/site.css', force=True)
+        self.assertRegexpMatches(css_url, r'^/static/bundles/site\.[0-9a-f]{12}\.css$')
+        css = self.read(css_url[len('/static/'):])
+        self.assertRegexpMatches(css, r'url\("\.\./vendor/lib/img/bg\.[0-9a-f]{12}\.png"\)')
+        self.assertTrue('body { color: black }' in css)
+        gz = gzip.GzipFile(fileobj=StringIO(self.read(css_url[len('/static/'):] + '.gz')))
+        self.assertEqual(gz.read(), css)
+
+        js = self.read(storage.url('bundles/site.js', force=True)[len('/static/'):])
+        self.assertTrue(js.startswith('var one = 1;\nvar two = 2'))
+        # Not worth compressing.
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, storage.url('css/main.css', force=True)[len('/static/'):]) + '.gz'))
+
+    def test_static_bundle_tag(self):
+        template = Template("{% load blog_tags %}{% static_bundle 'bundles/site.css' %}")
+        with override_settings(STATIC_BUNDLES=self.bundles, DEBUG=False):
+            self.assertEqual(template.render(Context()),
+                             '<link rel="stylesheet" href="/static/bundles/site.css">')
+        with override_settings(STATIC_BUNDLES=self.bundles, DEBUG=True):
+            self.assertEqual(template.render(Context()),
+                             '<link rel="stylesheet" href="/static/vendor/lib/css/lib.css">\n'
+                             '<link rel="stylesheet" href="/static/css/main.css">')
+
+    def request(self, path, **environ):
+        def application(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            return ['page']
+
+        def start_response(status, headers):
+            response['status'] = status
+            response['headers'] = dict(headers)
+
+        response = {}
+        environ.setdefault('REQUEST_METHOD', 'GET')
+        environ['PATH_INFO'] = path
+        handler = StaticFilesHandler(application, root=self.root, prefix='/static/')
+        response['content'] = ''.join(handler(environ, start_response))
+        return response
+
+    def test_handler_serves_hashed_files_forever(self):
+        self.write('site.0123456789ab.css', 'body { color: black }')
+        self.write('site.0123456789ab.css.gz', 'gzipped')
+        response = self.request('/static/site.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['status'], '200 OK')
+        self.assertEqual(response['content'], 'gzipped')
+        self.assertEqual(response['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['headers']['Content-Type'], 'text/css; charset=utf-8')
+        self.assertEqual(response['headers']['Cache-Control'], 'public, max-age=31536000, immutable')
+
+        response = self.request('/static/site.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertEqual(response['content'], 'body { color: black }')
+        self.assertFalse('Content-Encoding' in response['headers'])
+        self.assertEqual(response['headers']['Vary'], 'Accept-Encoding')
+
+        response = self.request('/static/site.0123456789ab.css',
+                                HTTP_IF_MODIFIED_SINCE=response['headers']['Last-Modified'])
+        self.assertEqual(response['status'], '304 Not Modified')
+
+    def test_handler_unhashed_missing_and_other_files(self):
+        self.write('robots.txt', 'User-agent: *')
+        response = self.request('/static/robots.txt')
+        self.assertEqual(response['content'], 'User-agent: *')
+        self.assertEqual(response['headers']['Cache-Control'], 'public, max-age=3600')
+        self.assertFalse('Vary' in response['headers'])
+
+        self.assertEqual(self.request('/static/missing.css')['status'], '404 Not Found')
+        self.assertEqual(self.request('/static/../tests.py')['status'], '404 Not Found')
+        self.assertEqual(self.request('/static/')['status'], '404 Not Found')
+        self.assertEqual(self.request('/static/robots.txt', REQUEST_METHOD='HEAD')['content'], '')
+        self.assertEqual(self.request('/about/')['content'], 'page')
+
+
+@override_settings(BLOG_INDEX_PAGINATION='keyset', BLOG_PAGINATION_COUNT=False, BLOG_PAGE_CACHE=False)
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        now = timezone.now()
+        # Posts 5 and 6 share a pub_date, so the id breaks the tie.
+        for i in range(12):
+            Post.objects.create(
+                title='Post %d' % i,
+                text='Post number %d' % i,
+                slug='post-%d' % i,
+                pub_date=now - timedelta(days=5 if i == 6 else i),
+                author=author,
+                site=Site.objects.get_current(),
+            )
+
+    def titles(self, response):
+        return [post.title for post in response.context['object_list']]
+
+    def test_walk_forward_and_back(self):
+        expected = [post.title for post in Post.objects.order_by('-pub_date', '-pk')]
+
+        seen = []
+        pages = []
+        response = self.client.get('/')
+        while True:
+            self.assertEquals(response.status_code, 200)
+            pages.append(self.titles(response))
+            seen.extend(self.titles(response))
+            page = response.context['page_obj']
+            if not page.has_next():
+                break
+            response = self.client.get('/', {'after': page.next_cursor()})
+        self.assertEquals(seen, expected)
+        self.assertEquals(len(pages), 3)
+
+        page = response.context['page_obj']
+        response = self.client.get('/', {'before': page.previous_cursor()})
+        self.assertEquals(self.titles(response), pages[1])
+        self.assertTrue(response.context['page_obj'].has_previous())
+
+        page = response.context['page_obj']
+        response = self.client.get('/', {'before': page.previous_cursor()})
+        self.assertEquals(self.titles(response), pages[0])
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_no_count_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+    def test_invalid_cursor(self):
+        self.assertEquals(self.client.get('/', {'after': 'bogus'}).status_code, 404)
+
+    def test_numbered_pages_without_count(self):
+        response = self.client.get('/3/')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(len(response.context['object_list']), 2)
+        self.assertFalse(response.context['page_obj'].has_next())
+        self.assertEquals(self.client.get('/4/').status_code, 404)
+
+@override_settings(BLOG_FEED_ITEMS=3)
+class FeedCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        now = timezone.now()
+        for i in range(5):
+            Post.objects.create(
+                title='Post %d' % i,
+                text='Post number %d' % i,
+                slug='post-%d' % i,
+                pub_date=now - timedelta(days=i),
+                author=author,
+                site=Site.objects.get_current(),
+            )
+
+    def get_feed(self, **extra):
+        # Returns the response and its content, streamed or not.
+        response = self.client.get('/feeds/posts/', **extra)
+        if response.streaming:
+            return response, b''.join(response.streaming_content)
+        return response, response.content
+
+    def test_item_limit(self):
+        response = self.client.get('/feeds/posts/')
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertEquals(content.count('<item>'), 3)
+        self.assertTrue('Post 0' in content)
+        self.assertFalse('Post 3' in content)
+
+    def test_iter_keyset(self):
+        posts = iter_keyset(Post.objects.all(), chunk_size=2)
+        self.assertEquals([post.slug for post in posts], ['post-%d' % i for i in range(5)])
+        posts = iter_keyset(Post.objects.all(), chunk_size=2, limit=3)
+        self.assertEquals([post.slug for post in posts], ['post-0', 'post-1', 'post-2'])
+
+    @override_settings(BLOG_FEED_ITEMS=None)
+    def test_whole_feed_streamed_in_chunks(self):
+        response = self.client.get('/feeds/posts/')
+        chunks = list(response.streaming_content)
+        # The channel, one chunk per post and the closing tags.
+        self.assertEquals(len(chunks), 7)
+        self.assertTrue('<title>Post 4</title>' in chunks[5])
+        self.assertTrue(chunks[-1].endswith('</rss>'))
+        self.assertEquals(cache.get(FEED_CACHE_KEY), None)
+
+    def test_cached_until_post_saved(self):
+        self.get_feed()
+        with self.assertNumQueries(0):
+            response = self.client.get('/feeds/posts/')
+        self.assertFalse(response.streaming)
+        self.assertTrue('Post 0' in response.content)
+
+        post = Post.objects.get(slug='post-0')
+        post.title = 'Edited post'
+        post.save()
+        response, content = self.get_feed()
+        self.assertTrue('Edited post' in content)
+
+    def test_not_modified(self):
+        self.get_feed()
+        response, content = self.get_feed()
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get('/feeds/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        response = self.client.get('/feeds/posts/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(response.status_code, 304)
+
+    def test_gzip(self):
+        self.get_feed()
+        response, content = self.get_feed(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        self.assertTrue('Accept-Encoding' in response['Vary'])
+        self.assertTrue('Post 0' in gzip.GzipFile(fileobj=StringIO(content)).read())
+
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        self.assertTrue('Post 0' in gzip.GzipFile(fileobj=StringIO(response.content)).read())
+
+        # Not the admin, whose CSRF tokens BREACH could recover.
+        response = self.client.get('/admin/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        category = Category(name='python', description='Python')
+        category.save()
+        self.tag = Tag(name='django', description='Django')
+        self.tag.save()
+        self.post = Post.objects.create(
+            title='My first post',
+            text='This is my first blog post',
+            slug='my-first-post',
+            pub_date=timezone.now() - timedelta(days=1),
+            author=author,
+            site=Site.objects.get_current(),
+            category=category,
+        )
+        self.post.tags.add(self.tag)
+        self.post_urls = ['/', self.post.get_absolute_url(), '/category/python/', '/tag/django/']
+
+    def test_not_modified(self):
+        # The index is dated by the stamps alone, the other pages by their
+        # own posts as well.
+        for url, queries in zip(self.post_urls, [1, 2, 2, 2]):
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, 200)
+
+            with self.assertNumQueries(queries):
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEquals(not_modified.status_code, 304)
+
+            not_modified = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEquals(not_modified.status_code, 304)
+
+    def test_stamps_are_shared_by_every_process(self):
+        # Another process has its own cache but reads the same stamps.
+        etag = self.client.get('/')['ETag']
+        get_page_cache().clear()
+        self.assertEquals(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Post.objects.filter(pk=self.post.pk).delete()
+        get_page_cache().clear()
+        self.assertEquals(self.client.get('/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_modified_after_edit(self):
+        etags = [self.client.get(url)['ETag'] for url in self.post_urls]
+        Post.objects.filter(pk=self.post.pk).update(modified=timezone.now() - timedelta(days=2))
+        self.post.text = 'This is my edited blog post'
+        self.post.save()
+
+        for url, etag in zip(self.post_urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 200)
+
+    def test_modified_after_tagging(self):
+        etag = self.client.get('/').get('ETag')
+        Post.objects.filter(pk=self.post.pk).update(modified=timezone.now() - timedelta(days=2))
+        self.post.tags.remove(self.tag)
+
+        response = self.client.get('/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_modified_after_rename_or_flatpage_change(self):
+        etags = [self.client.get(url)['ETag'] for url in self.post_urls]
+        self.tag.name = 'Django'
+        self.tag.save()
+        for url, etag in zip(self.post_urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 200)
+
+        etags = [self.client.get(url)['ETag'] for url in self.post_urls]
+        page = FlatPage.objects.create(url='/about/', title='About', content='About me')
+        page.sites.add(Site.objects.get_current())
+        for url, etag in zip(self.post_urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEquals(response.status_code, 200)
+
+@override_settings(BLOG_PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        self.category = Category(name='python', description='Python')
+        self.category.save()
+        self.tag = Tag(name='django', description='Django')
+        self.tag.save()
+        self.posts = []
+        for i in range(2):
+            post = Post.objects.create(
+                title='Post %d' % i,
+                text='Post number %d' % i,
+                slug='post-%d' % i,
+                pub_date=timezone.now() - timedelta(days=i),
+                author=author,
+                site=Site.objects.get_current(),
+                category=self.category if i == 0 else None,
+            )
+            self.posts.append(post)
+        self.posts[0].tags.add(self.tag)
+
+        self.page = FlatPage(url='/about/', title='About me', content='All about me')
+        self.page.save()
+        self.page.sites.add(Site.objects.get_current())
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        return response
+
+    def assertNotCached(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(len(queries) > 0, '%s was served from the cache' % url)
+        return response
+
+    def warm(self):
+        for url in self.cached_urls():
+            self.client.get(url)
+            self.assertCached(url)
+
+    def cached_urls(self):
+        return ['/', self.posts[0].get_absolute_url(), self.posts[1].get_absolute_url(),
+                '/category/python/', '/tag/django/', '/about/']
+
+    def test_post_save_purges_its_pages(self):
+        self.warm()
+        self.posts[0].title = 'Edited post'
+        self.posts[0].save()
+
+        for url in ['/', self.posts[0].get_absolute_url(), '/category/python/', '/tag/django/']:
+            self.assertTrue('Edited post' in self.assertNotCached(url).content)
+        self.assertCached(self.posts[1].get_absolute_url())
+        self.assertCached('/about/')
+
+    def test_slug_change_purges_old_url(self):
+        self.warm()
+        old_url = self.posts[0].get_absolute_url()
+        self.posts[0].slug = 'renamed-post'
+        self.posts[0].save()
+
+        self.assertEquals(self.client.get(old_url).status_code, 404)
+
+    def test_tag_rename_purges_tagged_posts(self):
+        self.warm()
+        self.tag.name = 'djangoproject'
+        self.tag.save()
+
+        self.assertTrue('djangoproject' in self.assertNotCached(self.posts[0].get_absolute_url()).content)
+        self.assertNotCached('/tag/django/')
+        self.assertCached(self.posts[1].get_absolute_url())
+
+    def test_tagging_purges_pages(self):
+        self.warm()
+        self.posts[1].tags.add(self.tag)
+
+        self.assertNotCached('/tag/django/')
+        self.assertNotCached(self.posts[1].get_absolute_url())
+        self.assertCached(self.posts[0].get_absolute_url())
+
+    def test_flatpage_save_purges_everything(self):
+        self.warm()
+        self.page.title = 'About us'
+        self.page.save()
+
+        for url in self.cached_urls():
+            self.assertTrue('About us' in self.assertNotCached(url).content)
+
+    def test_session_bypasses_cache(self):
+        self.warm()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'session'
+        self.assertNotCached('/')
+
+@override_settings(BLOG_PAGE_CACHE=True, BLOG_SITEMAP_SHARD_SIZE=2)
+class SitemapTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        self.category = Category(name='python', description='Python')
+        self.category.save()
+        self.tag = Tag(name='django', description='Django')
+        self.tag.save()
+        self.posts = []
+        for i in range(5):
+            self.posts.append(Post.objects.create(
+                title='Post %d' % i,
+                text='Post number %d' % i,
+                slug='post-%d' % i,
+                pub_date=datetime(2014, 6, 20 - i, tzinfo=timezone.utc),
+                author=author,
+                site=Site.objects.get_current(),
+                category=self.category,
+            ))
+        self.posts[0].tags.add(self.tag)
+        page = FlatPage.objects.create(url='/about/', title='About me', content='All about me')
+        page.sites.add(Site.objects.get_current())
+
+    def shard_url(self, section, pk):
+        return '/sitemap-%s-%d.xml' % (section, (pk - 1) // 2 + 1)
+
+    def test_index(self):
+        content = self.client.get('/sitemap.xml').content
+        shards = sorted(set(self.shard_url('posts', post.pk) for post in self.posts))
+        self.assertEquals(content.count('<sitemap>'), len(shards) + 3)
+        for url in shards:
+            self.assertTrue('<loc>http://testserver%s</loc>' % url in content)
+
+    def test_shards(self):
+        post = self.posts[1]
+        response = self.client.get(self.shard_url('posts', post.pk))
+        self.assertEquals(response['Content-Type'], 'application/xml')
+        self.assertTrue('<loc>http://testserver/2014/6/19/post-1/</loc>' in response.content)
+        self.assertTrue('Last-Modified' in response)
+
+        content = self.client.get(self.shard_url('categories', self.category.pk)).content
+        self.assertTrue('<loc>http://testserver/category/python/</loc>' in content)
+        self.assertTrue('<lastmod>' in content)
+        content = self.client.get(self.shard_url('tags', self.tag.pk)).content
+        self.assertTrue('<loc>http://testserver/tag/django/</loc>' in content)
+        content = self.client.get('/sitemap-flatpages-1.xml').content
+        self.assertTrue('<loc>http://testserver/about/</loc>' in content)
+
+    def test_unlisted_flatpages_and_shards(self):
+        page = FlatPage.objects.create(url='/members/', title='Members', content='Members only',
+                                       registration_required=True)
+        page.sites.add(Site.objects.get_current())
+        content = self.client.get(self.shard_url('flatpages', page.pk)).content
+        self.assertFalse('/members/' in content)
+
+        self.assertEquals(self.client.get('/sitemap-posts-999.xml').status_code, 404)
+
+    def test_post_change_only_purges_its_shard(self):
+        first, last = self.posts[0], self.posts[-1]
+        self.assertNotEqual(self.shard_url('posts', first.pk), self.shard_url('posts', last.pk))
+        urls = ['/sitemap.xml', self.shard_url('posts', first.pk), self.shard_url('posts', last.pk),
+                self.shard_url('tags', self.tag.pk)]
+        for url in urls:
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            for url in urls:
+                self.client.get(url)
+
+        last.title = 'Edited post'
+        last.save()
+        with self.assertNumQueries(0):
+            self.client.get('/sitemap.xml')
+            self.client.get(self.shard_url('posts', first.pk))
+            self.client.get(self.shard_url('tags', self.tag.pk))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.shard_url('posts', last.pk))
+        self.assertTrue(len(queries) > 0)
+
+        # Tagging changes the tag's lastmod.
+        last.tags.add(self.tag)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.shard_url('tags', self.tag.pk))
+        self.assertTrue(len(queries) > 0)
+
+    def test_category_changes_purge_their_shard_and_the_index(self):
+        url = self.shard_url('categories', self.category.pk)
+        self.client.get(url)
+        self.category.slug = 'python-language'
+        self.category.save()
+        content = self.client.get(url).content
+        self.assertTrue('<loc>http://testserver/category/python-language/</loc>' in content)
+        self.assertFalse('/category/python/' in content)
+
+        # Creating or deleting a category purges the index.
+        self.client.get('/sitemap.xml')
+        perl = Category(name='perl', description='Perl')
+        perl.save()
+        with CaptureQueriesContext(connection) as queries:
+            content = self.client.get('/sitemap.xml').content
+        self.assertTrue(len(queries) > 0)
+        self.assertTrue('<loc>http://testserver%s</loc>' % self.shard_url('categories', perl.pk) in content)
+        perl.delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/sitemap.xml')
+        self.assertTrue(len(queries) > 0)
+
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class ExportStaticTest(TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        category = Category(name='python', description='Python')
+        category.save()
+        self.tag = Tag(name='django', description='Django')
+        self.tag.save()
+        published = timezone.make_aware(datetime(2014, 6, 20, 12), timezone.utc)
+        self.posts = []
+        for i in range(7):
+            post = Post.objects.create(
+                title='Post %d' % i,
+                text='Post number %d' % i,
+                slug='post-%d' % i,
+                pub_date=published - timedelta(days=i),
+                author=author,
+                site=Site.objects.get_current(),
+                category=category if i == 0 else None,
+            )
+            self.posts.append(post)
+        self.posts[1].tags.add(self.tag)
+        page = FlatPage(url='/about/', title='About me', content='All about me')
+        page.save()
+        page.sites.add(Site.objects.get_current())
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def export(self, **options):
+        stdout = StringIO()
+        call_command('export_static', output=self.output, processes=1, host='testserver',
+                     stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def read(self, *path):
+        with open(os.path.join(self.output, *path)) as f:
+            return f.read()
+
+    def test_full_export(self):
+        output = self.export()
+
+        # 7 posts, 1 category, 1 tag, 2 pages each of the month and year
+        # archives and of the index, the feed and a flatpage
+        self.assertTrue('Exported 17 page(s)' in output)
+        self.assertTrue('Post 0' in self.read(self.posts[0].get_absolute_url().strip('/'), 'index.html'))
+        self.assertTrue('Post 0' in self.read('category', 'python', 'index.html'))
+        self.assertTrue('Post 1' in self.read('tag', 'django', 'index.html'))
+        self.assertEquals(self.read('index.html'), self.read('1', 'index.html'))
+        self.assertTrue('Post 6' in self.read('2', 'index.html'))
+        self.assertTrue('Post 6' in self.read('archive', '2014', '6', 'page', '2', 'index.html'))
+        self.assertTrue('Post 6' in self.read('archive', '2014', 'page', '2', 'index.html'))
+        self.assertTrue('<rss' in self.read('feeds', 'posts', 'index.xml'))
+        self.assertTrue('All about me' in self.read('about', 'index.html'))
+
+    def test_incremental_export(self):
+        self.export()
+        output = self.export(incremental=True)
+        # Nothing changed, only the flatpage is rendered again.
+        self.assertTrue('Exported 1 page(s)' in output)
+
+        self.posts[1].title = 'Edited post'
+        self.posts[1].save()
+        output = self.export(incremental=True)
+
+        # The post, its tag page, 2 pages each of its month and year
+        # archives and of the index, the feed and the flatpage
+        self.assertTrue('Exported 10 page(s)' in output)
+        self.assertTrue('Edited post' in self.read('archive', '2014', '6', 'index.html'))
+        self.assertTrue('Edited post' in self.read('tag', 'django', 'index.html'))
+        self.assertTrue('Edited post' in self.read('index.html'))
+
+    def test_incremental_export_after_delete(self):
+        self.export()
+        url = self.posts[1].get_absolute_url().strip('/')
+        self.posts[1].delete()
+        self.posts[2].delete()
+        output = self.export(incremental=True)
+
+        # The post pages and the second page of each archive and of the
+        # index are gone; the emptied tag page, the month and year
+        # archives, the index, the feed and the flatpage are rendered again.
+        self.assertTrue('Removed 5 page(s)' in output)
+        self.assertTrue('Exported 6 page(s)' in output)
+        self.assertFalse(os.path.exists(os.path.join(self.output, url)))
+        self.assertFalse(os.path.exists(os.path.join(self.output, '2', 'index.html')))
+        self.assertFalse(os.path.exists(os.path.join(self.output, 'archive', '2014', '6', 'page', '2')))
+        self.assertTrue(os.path.exists(os.path.join(self.output, 'archive', '2014', '6', 'page', '1')))
+        self.assertFalse('Post 1' in self.read('index.html'))
+        self.assertFalse('Post 1' in self.read('feeds', 'posts', 'index.xml'))
+        self.assertFalse('Post 1' in self.read('archive', '2014', '6', 'index.html'))
+
+    def test_incremental_export_after_category_change(self):
+        self.export()
+        Post.objects.filter(pk=self.posts[0].pk).update(category=None)
+        recount_categories()
+        output = self.export(incremental=True)
+
+        # The post, its old category, 2 pages each of its month and year
+        # archives and of the index, the feed and the flatpage
+        self.assertTrue('Exported 10 page(s)' in output)
+        self.assertFalse('Post 0' in self.read('category', 'python', 'index.html'))
+
+    def test_taxonomy_pages(self):
+        self.tag.post_set.add(*self.posts)
+        output = self.export()
+
+        # Tag pages 1 and 2 on top of the 17 pages of test_full_export
+        self.assertTrue('Exported 18 page(s)' in output)
+        self.assertEquals(self.read('tag', 'django', 'index.html'),
+                          self.read('tag', 'django', 'page', '1', 'index.html'))
+        self.assertTrue('href="/tag/django/page/2/"' in self.read('tag', 'django', 'index.html'))
+        self.assertTrue('Post 6' in self.read('tag', 'django', 'page', '2', 'index.html'))
+
+    def test_incremental_export_after_rename(self):
+        self.export()
+        self.tag.name = 'Django web framework'
+        self.tag.save()
+        output = self.export(incremental=True)
+
+        # The sidebar of every list page shows the tag names.
+        self.assertTrue('Exported 17 page(s)' in output)
+        self.assertTrue('Django web framework' in self.read(
+            self.posts[1].get_absolute_url().strip('/'), 'index.html'))
+        self.assertTrue('Django web framework' in self.read('index.html'))
+
+@override_settings(BLOG_PAGE_CACHE=False)
+class SearchTest(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        texts = [
+            ('Caching in Django', 'Django ships a cache framework with several backends.'),
+            ('Postgres tuning', 'Indexes matter. Django can use them through the ORM.'),
+            ('Holiday photos', 'Nothing about computers here.'),
+        ]
+        self.posts = []
+        for i, (title, text) in enumerate(texts):
+            self.posts.append(Post.objects.create(
+                title=title,
+                text=text,
+                slug='post-%d' % i,
+                pub_date=timezone.now() - timedelta(days=i),
+                author=author,
+                site=Site.objects.get_current(),
+            ))
+
+    def titles(self, query):
+        response = self.client.get('/search/', {'q': query})
+        self.assertEquals(response.status_code, 200)
+        return [post.title for post in response.context['object_list']]
+
+    def test_ranking(self):
+        # A title match outweighs a match in the body.
+        self.assertEquals(self.titles('django'), ['Caching in Django', 'Postgres tuning'])
+
+    def test_all_words_must_match(self):
+        self.assertEquals(self.titles('django indexes'), ['Postgres tuning'])
+        self.assertEquals(self.titles('django photos'), [])
+
+    def test_index_updated_on_save(self):
+        self.posts[2].text = 'Photos of the Django meetup.'
+        self.posts[2].save()
+        self.assertTrue('Holiday photos' in self.titles('meetup'))
+        self.assertEquals(self.titles('computers'), [])
+
+    def test_empty_query(self):
+        self.assertEquals(self.titles(''), [])
+
+    def test_pagination(self):
+        author = User.objects.get(username='testuser')
+        for i in range(6):
+            Post.objects.create(title='Cache %d' % i, text='cache', slug='cache-%d' % i,
+                                pub_date=timezone.now(), author=author,
+                                site=Site.objects.get_current())
+        response = self.client.get('/search/', {'q': 'cache', 'page': 2})
+        self.assertEquals(len(response.context['object_list']), 2)
+        self.assertEquals(response.context['paginator'].count, 7)
+
+    def test_rebuild_command(self):
+        SearchTerm.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEquals(self.titles('computers'), ['Holiday photos'])
+
+
+class PostAdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.login(username='admin', password='password')
+        self.category = Category(name='python', description='The Python language', slug='python')
+        self.category.save()
+
+    def add_posts(self, count):
+        # A month apart, so the date hierarchy always starts from the
+        # MonthArchive years or months.
+        for i in range(count):
+            post = Post(title='Post about django %d' % i, text='Some text', slug='post-%d' % i,
+                        pub_date=timezone.now() - timedelta(days=31 * i), author=self.admin,
+                        site=Site.objects.get_current(), category=self.category)
+            post.save()
+
+    def changelist_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/blogengine/post/', params or {})
+        self.assertEquals(response.status_code, 200)
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_posts(2)
+        response, few = self.changelist_queries()
+        Post.objects.all().delete()
+        self.add_posts(40)
+        response, many = self.changelist_queries()
+        self.assertEquals(few, many)
+        self.assertTrue('python' in response.content)
+
+    def test_search_uses_index(self):
+        self.add_posts(3)
+        Post.objects.create(title='Holiday photos', text='Nothing about computers', slug='holiday',
+                            pub_date=timezone.now(), author=self.admin, site=Site.objects.get_current())
+        response, _ = self.changelist_queries({'q': 'holiday'})
+        self.assertEquals([post.slug for post in response.context['cl'].result_list], ['holiday'])
+        response, _ = self.changelist_queries({'q': 'django'})
+        self.assertEquals(len(response.context['cl'].result_list), 3)
+
+    def test_date_hierarchy(self):
+        for slug, year, month, day in [('first', 2013, 12, 31), ('second', 2014, 1, 5),
+                                       ('third', 2014, 1, 6), ('fourth', 2014, 3, 1)]:
+            Post.objects.create(title=slug, text='Text', slug=slug, author=self.admin,
+                                pub_date=timezone.make_aware(datetime(year, month, day, 12), timezone.utc),
+                                site=Site.objects.get_current(), category=self.category)
+
+        # session + user + count + posts + the years from MonthArchive
+        response, queries = self.changelist_queries()
+        self.assertEquals(queries, 5)
+        self.assertTrue('?pub_date__year=2013"' in response.content)
+        self.assertTrue('?pub_date__year=2014"' in response.content)
+
+        # The total, estimated on PostgreSQL, and the months of the year
+        # from MonthArchive
+        response, queries = self.changelist_queries({'pub_date__year': 2014})
+        self.assertEquals(queries, 6)
+        self.assertTrue(isinstance(response.context['cl'].root_queryset, EstimatedCountQuerySet))
+        self.assertEquals([post.slug for post in response.context['cl'].result_list],
+                          ['fourth', 'third', 'second'])
+        self.assertTrue('January 2014' in response.content and 'March 2014' in response.content)
+        self.assertFalse('February 2014' in response.content)
+
+        # The days of a month are grouped by Django, within the month
+        response, queries = self.changelist_queries({'pub_date__year': 2014, 'pub_date__month': 1})
+        self.assertEquals(queries, 6)
+        self.assertEquals([post.slug for post in response.context['cl'].result_list], ['third', 'second'])
+        self.assertTrue('January 5' in response.content and 'January 6' in response.content)
+
+    def test_estimated_count_needs_postgresql_and_no_filter(self):
+        self.add_posts(3)
+        self.assertEquals(estimated_count(Post.objects.all(), 0), None)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        self.assertEquals(paginator.count, 3)
+        self.assertEquals(paginator.num_pages, 2)
+        self.assertEquals(len(paginator.page(2).object_list), 1)
+
+
+class SlugAllocationTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+
+    def test_allocate_slugs(self):
+        Tag(name='Django', description='', slug='django-2').save()
+        Tag(name='Django', description='', slug='django').save()
+        with self.assertNumQueries(1):
+            slugs = allocate_slugs(Tag, ['Django', 'Django', 'Flask', 'django 2', '!!!'])
+        self.assertEquals(slugs, ['django-3', 'django-4', 'flask', 'django-2-2', 'tag'])
+
+    def test_long_names_keep_the_suffix(self):
+        Tag(name='x', description='', slug='a' * 40).save()
+        self.assertEquals(allocate_slugs(Tag, ['a' * 50]), ['a' * 38 + '-2'])
+
+    def test_long_duplicate_names(self):
+        name = 'A very long category name about django performance tuning'
+        categories = []
+        for i in range(4):
+            category = Category(name=name, description='')
+            category.save()
+            categories.append(category.slug)
+        self.assertEquals(categories, [
+            'a-very-long-category-name-about-django-p', 'a-very-long-category-name-about-django-2',
+            'a-very-long-category-name-about-django-3', 'a-very-long-category-name-about-django-4'])
+        self.assertEquals(allocate_slugs(Category, [name, name]),
+                          ['a-very-long-category-name-about-django-5', 'a-very-long-category-name-about-django-6'])
+
+        title = 'Speeding up the blog with denormalized counts and caches'
+        slugs = []
+        for i in range(3):
+            post = Post(title=title, text='Text', pub_date=timezone.now(),
+                        author=self.author, site=Site.objects.get_current())
+            post.save()
+            slugs.append(post.slug)
+        self.assertEquals(len(set(slugs)), 3)
+
+    def test_many_duplicates_of_a_long_name(self):
+        # From -100 on, the suffix cuts into a 37 character slug.
+        name = 'A category name of thirty seven chars'
+        for i in range(105):
+            Category(name=name, description='').save()
+        taken = set(Category.objects.values_list('slug', flat=True))
+        self.assertEquals(len(taken), 105)
+        self.assertTrue('a-category-name-of-thirty-seven-char-105' in taken)
+
+    def test_save_retries_a_slug_taken_concurrently(self):
+        Category(name='Python', description='').save()
+        taken_slugs = blogengine.slugs.taken_slugs
+
+        def stale_taken_slugs(*args, **kwargs):
+            # Another process saved python after this one looked.
+            blogengine.slugs.taken_slugs = taken_slugs
+            return set()
+        blogengine.slugs.taken_slugs = stale_taken_slugs
+        try:
+            category = Category(name='Python', description='')
+            category.save()
+        finally:
+            blogengine.slugs.taken_slugs = taken_slugs
+        self.assertEquals(category.slug, 'python-2')
+
+    def test_duplicate_names_save(self):
+        for i in range(3):
+            category = Category(name='Python', description='The Python language')
+            category.save()
+        self.assertEquals(category.slug, 'python-3')
+        tag = Tag(name='Python', description='The Python language')
+        tag.save()
+        self.assertEquals(tag.slug, 'python')
+
+    def test_post_slugs(self):
+        post = Post(title='My first post', text='Text', pub_date=timezone.now(),
+                    author=self.author, site=Site.objects.get_current())
+        post.save()
+        self.assertEquals(post.slug, 'my-first-post')
+
+        tag = Tag(name='python', description='The Python language')
+        tag.save()
+        data = {'title': 'My first post', 'text': 'Text', 'slug': 'my-first-post',
+                'pub_date': '2014-06-20 10:00:00', 'author': self.author.pk,
+                'site': Site.objects.get_current().pk, 'tags': [tag.pk]}
+        form = PostAdminForm(data, instance=Post())
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEquals(form.cleaned_data['slug'], 'my-first-post-2')
+        # A post keeps its own slug.
+        form = PostAdminForm(data, instance=post)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEquals(form.cleaned_data['slug'], 'my-first-post')
+
+
+RSS_IMPORT = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Old blog</title><link>http://old.example.com/</link>
+<item><title>Hello world</title><link>http://old.example.com/hello/</link>
+<pubDate>Fri, 20 Jun 2014 10:00:00 GMT</pubDate><category>news</category>
+<description>&lt;p&gt;First &amp;amp; best&lt;/p&gt;&lt;p&gt;Second paragraph&lt;/p&gt;</description></item>
+<item><title>Another post</title><link>http://old.example.com/another/</link>
+<pubDate>Sat, 21 Jun 2014 10:00:00 GMT</pubDate><category>news</category><category>python</category>
+<description>Plain words</description></item>
+</channel></rss>
+"""
+
+
+class ImportPostsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        self.directory = tempfile.mkdtemp()
+        self.write('posts/caching.md', '---\ntitle: Caching in Django\ndate: 2014-05-01 09:30\n'
+                   'slug: caching\ncategory: Django\ntags: [python, cache]\n---\n\n'
+                   'Use the *cache*.\n')
+        self.write('posts/2014/untitled-thoughts.markdown', 'No front matter at all.\n')
+        self.write('old.rss', RSS_IMPORT)
+        Post.objects.create(title='Hello world', text='Already here', slug='hello-world',
+                            pub_date=timezone.now(), author=self.author, site=Site.objects.get_current())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def import_posts(self):
+        out = StringIO()
+        call_command('import_posts', os.path.join(self.directory, 'posts'),
+                     os.path.join(self.directory, 'old.rss'),
+                     author='testuser', category='Imported', jobs=1, batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_import(self):
+        self.assertTrue('Imported 4 post(s)' in self.import_posts())
+
+        post = Post.objects.get(slug='caching')
+        self.assertEquals(post.title, 'Caching in Django')
+        self.assertEquals(post.category.name, 'Django')
+        self.assertEquals(sorted(post.tags.values_list('slug', flat=True)), ['cache', 'python'])
+        self.assertTrue('<em>cache</em>' in post.rendered_text)
+        self.assertEquals(timezone.localtime(post.pub_date).hour, 9)
+
+        untitled = Post.objects.get(title='untitled thoughts')
+        self.assertEquals(untitled.category.name, 'Imported')
+
+        hello = Post.objects.get(slug='hello-world-2')
+        self.assertEquals(hello.text, 'First & best\n\nSecond paragraph')
+        self.assertEquals(hello.pub_date, datetime(2014, 6, 20, 10, tzinfo=timezone.utc))
+
+        self.assertEquals(Tag.objects.get(slug='python').post_count, 2)
+        self.assertEquals(Tag.objects.get(slug='news').post_count, 2)
+        self.assertEquals(Category.objects.get(slug='imported').post_count, 3)
+        self.assertEquals(MonthArchive.objects.get(year=2014, month=6).post_count, 2)
+        response = self.client.get('/search/', {'q': 'paragraph'})
+        self.assertEquals([p.slug for p in response.context['object_list']], ['hello-world-2'])
+
+    def test_rerun_skips_imported_posts(self):
+        self.import_posts()
+        self.assertTrue('Imported 0 post(s), skipped 4 already imported' in self.import_posts())
+        self.assertEquals(Post.objects.count(), 5)
+
+    def test_rerun_skips_posts_with_their_own_slug(self):
+        self.import_posts()
+        Post.objects.update(import_key='')
+        self.assertTrue('skipped 1 already imported' in self.import_posts())
+        self.assertEquals(Post.objects.filter(title='Caching in Django').count(), 1)
+
+    def test_failed_import_still_recounts(self):
+        import_batch = PostImporter.import_batch
+        calls = []
+
+        def failing_import_batch(importer, records):
+            calls.append(records)
+            if len(calls) > 1:
+                raise RuntimeError('The database went away')
+            import_batch(importer, records)
+
+        PostImporter.import_batch = failing_import_batch
+        try:
+            self.assertRaises(RuntimeError, self.import_posts)
+        finally:
+            PostImporter.import_batch = import_batch
+        # The first batch, both Markdown files, was committed.
+        self.assertEquals(Category.objects.get(slug='imported').post_count, 1)
+        self.assertEquals(Tag.objects.get(slug='python').post_count, 1)
+
+
+
+class ExportCorpusTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        author = User.objects.create_user('testuser', 'user@example.com', 'password')
+        category = Category(name='python', description='The Python language', slug='python')
+        category.save()
+        tag = Tag(name='django', description='The Django framework', slug='django')
+        tag.save()
+        for i in range(5):
+            post = Post.objects.create(title='Post %d' % i, text='Text %d' % i, slug='post-%d' % i,
+                                       pub_date=timezone.now(), author=author,
+                                       site=Site.objects.get_current(), category=category)
+            post.tags.add(tag)
+        page = FlatPage.objects.create(url='/about/', title='About me', content='All about me')
+        page.sites.add(Site.objects.get_current())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, name, **options):
+        output = os.path.join(self.directory, name)
+        call_command('export_corpus', output=output, chunk_size=2, stdout=StringIO(), **options)
+        return output
+
+    def read_lines(self, output):
+        with gzip.open(output) as f:
+            return [json.loads(line) for line in f]
+
+    def test_jsonl(self):
+        output = self.export('corpus.jsonl.gz')
+        records = self.read_lines(output)
+        self.assertEquals([record['model'] for record in records],
+                          ['blogengine.category', 'blogengine.tag', 'flatpages.flatpage'] + ['blogengine.post'] * 5)
+        post = records[3]['fields']
+        self.assertEquals((post['slug'], post['category'], post['author'], post['site'], post['tags']),
+                          ('post-0', 'python', 'testuser', 'example.com', ['django']))
+        self.assertEquals(records[2]['fields']['sites'], ['example.com'])
+        self.assertFalse(os.path.exists(output + '.state'))
+
+    def test_tar(self):
+        output = self.export('corpus.tar')
+        with tarfile.open(output) as tar:
+            names = tar.getnames()
+            member = gzip.GzipFile(fileobj=tar.extractfile(names[-1])).read()
+        self.assertEquals(len(names), 6)
+        self.assertTrue(names[-1].startswith('blogengine.post/'))
+        self.assertEquals(json.loads(member.splitlines()[0])['fields']['slug'], 'post-4')
+
+    def test_since(self):
+        Post.objects.exclude(slug='post-2').update(modified=datetime(2014, 1, 1, tzinfo=timezone.utc))
+        records = self.read_lines(self.export('corpus.jsonl.gz', since='2014-06-01T00:00:00'))
+        self.assertEquals([r['fields']['slug'] for r in records if r['model'] == 'blogengine.post'], ['post-2'])
+        self.assertEquals(len(records), 4)
+
+    def test_resume(self):
+        write_chunk = export_corpus.JsonLinesArchive.write_chunk
+        calls = []
+
+        def interrupted(archive, label, chunk):
+            calls.append(label)
+            if label == 'blogengine.post' and calls.count(label) == 2:
+                # Half a chunk reached the disk.
+                with open(archive.path, 'ab') as f:
+                    f.write(b'\x1f\x8b garbage')
+                raise KeyboardInterrupt
+            write_chunk(archive, label, chunk)
+
+        export_corpus.JsonLinesArchive.write_chunk = interrupted
+        try:
+            self.assertRaises(KeyboardInterrupt, self.export, 'corpus.jsonl.gz')
+        finally:
+            export_corpus.JsonLinesArchive.write_chunk = write_chunk
+        output = self.export('corpus.jsonl.gz', resume=True)
+        slugs = [r['fields']['slug'] for r in self.read_lines(output) if r['model'] == 'blogengine.post']
+        self.assertEquals(slugs, ['post-%d' % i for i in range(5)])
+
 
 class BaseAcceptanceTest(LiveServerTestCase):
     def setUp(self):
@@ -1,28 +1,39 @@
 from django.conf.urls import patterns, url
-from django.views.generic import ListView, DetailView
+from django.views.decorators.gzip import gzip_page
+from blogengine.cache import (ARCHIVE_GROUP, CATEGORY_GROUP, INDEX_GROUP, POST_GROUP, SIDEBAR_GROUP,
+                              SITEMAP_GROUP, SITEMAP_INDEX_GROUP, TAG_GROUP, cache_page_group)
 from blogengine.models import Post, Category, Tag
-from blogengine.views import CategoryListView, TagListView, PostsFeed
+from blogengine.views import (CategoryListView, PostDayArchiveView, PostDetailView, PostIndexView,
+                              PostMonthArchiveView, PostYearArchiveView, SearchView, TagListView, PostsFeed,
+                              sitemap_index, sitemap_shard)
 
+# Only the public pages are compressed: compressing pages that carry a
+# secret, such as the admin's CSRF tokens, exposes it to BREACH.
 urlpatterns = patterns('',
         # Index
-        url(r'^(?P<page>\d+)?/?$', ListView.as_view(
-            model=Post,
-            paginate_by=5,
-        )),
+        url(r'^(?P<page>\d+)?/?$', gzip_page(cache_page_group(INDEX_GROUP, SIDEBAR_GROUP)(PostIndexView.as_view()))),
+        # Archives, under a prefix of their own since a year looks like an index page number
+        url(r'^archive/(?P<year>\d{4})(?:/page/(?P<page>\d+))?/?$', gzip_page(cache_page_group(ARCHIVE_GROUP, SIDEBAR_GROUP)(PostYearArchiveView.as_view()))),
+        url(r'^archive/(?P<year>\d{4})/(?P<month>\d{1,2})(?:/page/(?P<page>\d+))?/?$', gzip_page(cache_page_group(ARCHIVE_GROUP, SIDEBAR_GROUP)(PostMonthArchiveView.as_view()))),
+        url(r'^archive/(?P<year>\d{4})/(?P<month>\d{1,2})/(?P<day>\d{1,2})(?:/page/(?P<page>\d+))?/?$', gzip_page(cache_page_group(ARCHIVE_GROUP, SIDEBAR_GROUP)(PostDayArchiveView.as_view()))),
         # Individual posts
-        url(r'^(?P<pub_date__year>\d{4})/(?P<pub_date__month>\d{1,2})/(?P<pub_date__day>\d{1,2})/(?P<slug>[a-zA-Z0-9-]+)/?$',  DetailView.as_view(
-            model=Post,
-        )),
+        url(r'^(?P<pub_date__year>\d{4})/(?P<pub_date__month>\d{1,2})/(?P<pub_date__day>\d{1,2})/(?P<slug>[a-zA-Z0-9-]+)/?$',  gzip_page(cache_page_group(POST_GROUP)(PostDetailView.as_view()))),
         # Categories
-        url(r'^category/(?P<slug>[a-zA-Z0-9-]+)/?$', CategoryListView.as_view(
+        url(r'^category/(?P<slug>[a-zA-Z0-9-]+)(?:/page/(?P<page>\d+))?/?$', gzip_page(cache_page_group(CATEGORY_GROUP, SIDEBAR_GROUP)(CategoryListView.as_view(
             paginate_by=5,
             model=Category,
-        )),
+        )))),
         # Tags
-        url(r'^tag/(?P<slug>[a-zA-Z0-9-]+)/?$', TagListView.as_view(
+        url(r'^tag/(?P<slug>[a-zA-Z0-9-]+)(?:/page/(?P<page>\d+))?/?$', gzip_page(cache_page_group(TAG_GROUP, SIDEBAR_GROUP)(TagListView.as_view(
             paginate_by=5,
             model=Tag,
-        )),
+        )))),
+        # Search
+        url(r'^search/$', gzip_page(SearchView.as_view())),
+        # Sitemaps, see blogengine.sitemaps
+        url(r'^sitemap\.xml$', gzip_page(cache_page_group(SITEMAP_INDEX_GROUP)(sitemap_index))),
+        url(r'^sitemap-(?P<section>posts|categories|tags|flatpages)-(?P<shard>[1-9]\d*)\.xml$',
+            gzip_page(cache_page_group(SITEMAP_GROUP)(sitemap_shard))),
         # Post RSS Feed
         url(r'^feeds/posts/$', PostsFeed(
         )),
@@ -1,36 +1,395 @@
-from django.shortcuts import render
-from django.views.generic import ListView
-from blogengine.models import Category, Post, Tag
-from django.contrib.syndication.views import Feed
+import datetime
+import hashlib
+import json
+import os
+from calendar import timegm
 
-class CategoryListView(ListView):
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.shortcuts import get_object_or_404, render
+from django.template.response import TemplateResponse
+from django.db.models import Count, Max, Min, Q
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from django.views.generic import DayArchiveView, DetailView, ListView, MonthArchiveView, YearArchiveView
+from blogengine.cache import get_feed_response, set_feed_response
+from blogengine.counts import archive_datetime, month_range
+from blogengine.db.pool import pool_stats
+from blogengine.feeds import StreamingRss201rev2Feed
+from blogengine.markup import render_cache
+from blogengine.models import Category, MonthArchive, Post, Tag
+from blogengine.pagination import UncountedPaginator, iter_keyset, keyset_page
+from blogengine.performance import histogram
+from blogengine.search import search_posts
+from blogengine.sitemaps import SECTIONS, section_shards, shard_entries, shard_queryset
+from blogengine.stamps import CHROME_STAMP, POSTS_STAMP, get_stamps
+from django.contrib.sites.models import get_current_site
+from django.contrib.syndication.views import Feed, add_domain
+
+class ConditionalPostMixin(object):
+    """
+    Answers If-None-Match and If-Modified-Since with a 304 before the
+    page is rendered. The validators are the newest of the stamps named
+    by validator_stamps and of the modification times of the posts
+    returned by validator_queryset(), with the number of those posts.
+    The number is what notices deleted posts; views that cannot afford
+    to count skip it.
+    """
+    count_validator = True
+    # Category, tag and flatpage changes show on every page.
+    validator_stamps = (CHROME_STAMP,)
+
+    def validator_queryset(self):
+        # None when the stamps alone date the page.
+        return None
+
+    def get_validators(self):
+        candidates = get_stamps(*self.validator_stamps)
+        count = None
+        queryset = self.validator_queryset()
+        if queryset is not None:
+            aggregates = {'latest': Max('modified')}
+            if self.count_validator:
+                aggregates['count'] = Count('pk')
+            result = queryset.aggregate(**aggregates)
+            if result['latest'] is None:
+                return None, None
+            candidates.append(result['latest'])
+            count = result.get('count')
+        if not candidates:
+            return None, None
+        latest = max(candidates)
+        etag = latest.strftime('%Y%m%d%H%M%S%f')
+        if count is not None:
+            etag = '%s-%d' % (etag, count)
+        return etag, latest
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super(ConditionalPostMixin, self).dispatch(request, *args, **kwargs)
+        etag, last_modified = self.get_validators()
+        view = condition(etag_func=lambda request, *args, **kwargs: etag,
+                         last_modified_func=lambda request, *args, **kwargs: last_modified)
+        return view(super(ConditionalPostMixin, self).dispatch)(request, *args, **kwargs)
+
+class PostDetailView(ConditionalPostMixin, DetailView):
     def get_queryset(self):
-        slug = self.kwargs['slug']
+        return Post.objects.listing()
+
+    def validator_queryset(self):
+        return Post.objects.filter(slug=self.kwargs['slug'])
+
+class PaginationMixin(object):
+    paginate_by = 5
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # Without a total count there are no page numbers to validate
+        # against, which saves a COUNT(*) per page.
+        if not getattr(settings, 'BLOG_PAGINATION_COUNT', True):
+            return UncountedPaginator(queryset, per_page, orphans=orphans,
+                                      allow_empty_first_page=allow_empty_first_page, **kwargs)
+        return super(PaginationMixin, self).get_paginator(queryset, per_page, orphans,
+                                                          allow_empty_first_page, **kwargs)
+
+    def get_page_path(self):
+        # Numbered pages are linked as <page path><number>/, which a
+        # static export can write to disk unlike a ?page= query.
+        return '/'
+
+    def get_context_data(self, **kwargs):
+        context = super(PaginationMixin, self).get_context_data(**kwargs)
+        context['page_path'] = self.get_page_path()
+        return context
+
+class PostListView(ConditionalPostMixin, PaginationMixin, ListView):
+    pass
+
+class PostIndexView(PostListView):
+    def get_queryset(self):
+        return Post.objects.listing()
+
+    # Aggregating every post per request would cost more than the page.
+    validator_stamps = (POSTS_STAMP, CHROME_STAMP)
+
+    def paginate_queryset(self, queryset, page_size):
+        # Numbered pages stay available for old links; the bare index
+        # pages through the archive with (pub_date, id) cursors.
+        if (getattr(settings, 'BLOG_INDEX_PAGINATION', 'offset') != 'keyset'
+                or self.kwargs.get(self.page_kwarg)):
+            return super(PostIndexView, self).paginate_queryset(queryset, page_size)
         try:
-            category = Category.objects.get(slug=slug)
-            return Post.objects.filter(category=category)
-        except Category.DoesNotExist:
-            return Post.objects.none()
+            page = keyset_page(queryset, page_size,
+                               after=self.request.GET.get('after'),
+                               before=self.request.GET.get('before'),
+                               count=getattr(settings, 'BLOG_PAGINATION_COUNT', True))
+        except InvalidPage:
+            raise Http404
+        return (None, page, page.object_list, page.has_other_pages())
+
+class CategoryListView(PostListView):
+    def get_queryset(self):
+        slug = self.kwargs['slug']
+        return Post.objects.listing().filter(category__slug=slug)
 
-class TagListView(ListView):
+    def validator_queryset(self):
+        return Post.objects.filter(category__slug=self.kwargs['slug'])
+
+    def get_page_path(self):
+        return '%spage/' % Category(slug=self.kwargs['slug']).get_absolute_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(CategoryListView, self).get_context_data(**kwargs)
+        # The category comes from the joined posts, so it is only looked
+        # up when the page is empty, to tell an unknown slug apart.
+        if context['object_list']:
+            context['category'] = context['object_list'][0].category
+        else:
+            context['category'] = get_object_or_404(Category, slug=self.kwargs['slug'])
+        return context
+
+class TagListView(PostListView):
     def get_queryset(self):
         slug = self.kwargs['slug']
+        return Post.objects.listing().filter(tags__slug=slug)
+
+    def validator_queryset(self):
+        return Post.objects.filter(tags__slug=self.kwargs['slug'])
+
+    def get_page_path(self):
+        return '%spage/' % Tag(slug=self.kwargs['slug']).get_absolute_url()
+
+    def get_context_data(self, **kwargs):
+        context = super(TagListView, self).get_context_data(**kwargs)
+        slug = self.kwargs['slug']
+        if not context['object_list']:
+            context['tag'] = get_object_or_404(Tag, slug=slug)
+            return context
+        for tag in context['object_list'][0].tags.all():
+            if tag.slug == slug:
+                context['tag'] = tag
+        return context
+
+class DateArchiveMixin(ConditionalPostMixin, PaginationMixin):
+    """
+    Lists the posts of a year, month or day with the index template. The
+    months with posts and their neighbours come from MonthArchive rather
+    than from grouping the posts.
+    """
+    date_field = 'pub_date'
+    month_format = '%m'
+    make_object_list = True
+    # The index lists scheduled posts too.
+    allow_future = True
+    template_name = 'blogengine/post_list.html'
+
+    def get_queryset(self):
+        return Post.objects.listing()
+
+    def archive_range(self):
+        year = int(self.kwargs['year'])
         try:
-            tag = Tag.objects.get(slug=slug)
-            return tag.post_set.all()
-        except Tag.DoesNotExist:
-            return Post.objects.none()
+            if 'month' not in self.kwargs:
+                return archive_datetime(year, 1), archive_datetime(year + 1, 1)
+            month = int(self.kwargs['month'])
+            if 'day' not in self.kwargs:
+                return month_range(year, month)
+            day = datetime.date(year, month, int(self.kwargs['day']))
+        except ValueError:
+            raise Http404
+        following = day + datetime.timedelta(days=1)
+        return (archive_datetime(day.year, day.month, day.day),
+                archive_datetime(following.year, following.month, following.day))
+
+    def validator_queryset(self):
+        since, until = self.archive_range()
+        return Post.objects.filter(pub_date__gte=since, pub_date__lt=until)
+
+    def get_date_list(self, queryset, date_type=None, ordering='ASC'):
+        # The posts are already known to exist, see get_dated_queryset().
+        return None
+
+    def get_neighbour_month(self, date, is_previous):
+        year, month = date.year, date.month
+        if is_previous:
+            months = MonthArchive.objects.filter(Q(year__lt=year) | Q(year=year, month__lt=month))
+        else:
+            months = MonthArchive.objects.filter(Q(year__gt=year) | Q(year=year, month__gt=month))
+        months = months.order_by(*(('-year', '-month') if is_previous else ('year', 'month')))
+        found = months.values_list('year', 'month').first()
+        return datetime.date(found[0], found[1], 1) if found else None
+
+    def get_previous_month(self, date):
+        return self.get_neighbour_month(date, True)
+
+    def get_next_month(self, date):
+        return self.get_neighbour_month(date, False)
+
+    def get_previous_year(self, date):
+        found = MonthArchive.objects.filter(year__lt=date.year).aggregate(year=Max('year'))['year']
+        return datetime.date(found, 1, 1) if found else None
+
+    def get_next_year(self, date):
+        found = MonthArchive.objects.filter(year__gt=date.year).aggregate(year=Min('year'))['year']
+        return datetime.date(found, 1, 1) if found else None
+
+    def get_neighbour_day(self, date, is_previous):
+        # Only the date is needed, not a post with its relations.
+        since = archive_datetime(date.year, date.month, date.day)
+        if is_previous:
+            dates = Post.objects.filter(pub_date__lt=since).order_by('-pub_date')
+        else:
+            following = date + datetime.timedelta(days=1)
+            dates = Post.objects.filter(
+                pub_date__gte=archive_datetime(following.year, following.month, following.day)
+            ).order_by('pub_date')
+        found = dates.values_list('pub_date', flat=True).first()
+        if found is None:
+            return None
+        return (timezone.localtime(found) if settings.USE_TZ else found).date()
+
+    def get_previous_day(self, date):
+        return self.get_neighbour_day(date, True)
+
+    def get_next_day(self, date):
+        return self.get_neighbour_day(date, False)
+
+    def get_page_path(self):
+        parts = [self.kwargs[name] for name in ('year', 'month', 'day') if name in self.kwargs]
+        return '/archive/%s/page/' % '/'.join(parts)
+
+class PostYearArchiveView(DateArchiveMixin, YearArchiveView):
+    pass
+
+class PostMonthArchiveView(DateArchiveMixin, MonthArchiveView):
+    pass
+
+class PostDayArchiveView(DateArchiveMixin, DayArchiveView):
+    pass
+
+class SearchView(ListView):
+    paginate_by = 5
+    template_name = 'blogengine/search.html'
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        if not self.query:
+            return []
+        return search_posts(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
 
 class PostsFeed(Feed):
     title = "RSS feed - posts"
     link = "feeds/posts/"
     description = "RSS feed - blog posts"
+    feed_type = StreamingRss201rev2Feed
+
+    # Compressed here rather than in the URLconf, which would hide the
+    # class from the performance histogram.
+    @method_decorator(gzip_page)
+    def __call__(self, request, *args, **kwargs):
+        # The XML is streamed item by item. A limited feed is also cached
+        # until a post is saved or deleted, and ConditionalGetMiddleware
+        # answers pollers from its validators.
+        response = get_feed_response()
+        if response is not None:
+            return response
+        feed = self.get_feed(None, request)
+        response = StreamingHttpResponse(content_type=feed.mime_type)
+        response['Last-Modified'] = http_date(timegm(feed.latest_post_date().utctimetuple()))
+        chunks = feed.stream('utf-8')
+        if self.limit() is not None:
+            chunks = self.cache_stream(chunks, response)
+        response.streaming_content = chunks
+        return response
+
+    def cache_stream(self, chunks, streamed):
+        content = []
+        for chunk in chunks:
+            content.append(chunk)
+            yield chunk
+        # Only reached once the whole feed was sent.
+        response = HttpResponse(b''.join(content), content_type=streamed['Content-Type'])
+        response['Last-Modified'] = streamed['Last-Modified']
+        response['ETag'] = '"%s"' % hashlib.md5(response.content).hexdigest()
+        set_feed_response(response)
+
+    def limit(self):
+        return getattr(settings, 'BLOG_FEED_ITEMS', 20)
+
+    def get_feed(self, obj, request):
+        # Feed.get_feed() would build every item before writing any.
+        site = get_current_site(request)
+        secure = request.is_secure()
+
+        def item_source():
+            for item in self.items():
+                link = add_domain(site.domain, self.item_link(item), secure)
+                yield {
+                    'title': self.item_title(item),
+                    'link': link,
+                    'description': self.item_description(item),
+                    'unique_id': link,
+                    'pubdate': self.item_pubdate(item),
+                }
+
+        return self.feed_type(
+            title=self.title,
+            link=add_domain(site.domain, self.link, secure),
+            description=self.description,
+            language=settings.LANGUAGE_CODE,
+            feed_url=add_domain(site.domain, request.path, secure),
+            latest_post_date=Post.objects.aggregate(latest=Max('pub_date'))['latest'],
+            item_source=item_source(),
+        )
 
     def items(self):
-        return Post.objects.order_by('-pub_date')
+        return iter_keyset(Post.objects.all(), limit=self.limit())
 
     def item_title(self, item):
         return item.title
 
     def item_description(self, item):
         return item.text
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+def sitemap_index(request):
+    locations = [request.build_absolute_uri('/sitemap-%s-%d.xml' % (section, shard))
+                 for section in SECTIONS for shard in section_shards(section)]
+    return TemplateResponse(request, 'sitemap_index.xml', {'sitemaps': locations},
+                            content_type='application/xml')
+
+
+def sitemap_shard(request, section, shard):
+    prefix = request.build_absolute_uri('/')[:-1]
+    urlset = [{'location': prefix + path, 'lastmod': lastmod}
+              for path, lastmod in shard_entries(section, int(shard))]
+    # A shard past the last row is not in the index; one whose rows are
+    # all unlisted still is.
+    if not urlset and not shard_queryset(section, int(shard)).exists():
+        raise Http404
+    response = TemplateResponse(request, 'sitemap.xml', {'urlset': urlset}, content_type='application/xml')
+    lastmods = [url['lastmod'] for url in urlset if url['lastmod']]
+    if lastmods:
+        response['Last-Modified'] = http_date(timegm(max(lastmods).utctimetuple()))
+    return response
+
+@staff_member_required
+def performance_stats(request):
+    """
+    Shows the request histogram, database pools and Markdown render cache
+    of the process that serves this request.
+    """
+    data = {'pid': os.getpid(), 'patterns': histogram.snapshot(), 'database_pools': pool_stats(),
+            'markdown_cache': render_cache.info()}
+    return HttpResponse(json.dumps(data, indent=2, sort_keys=True), content_type='application/json')
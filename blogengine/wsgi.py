@@ -0,0 +1,119 @@
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from django.conf import settings
+
+# Names fingerprinted by the storage, e.g. main.0123456789ab.css.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Unhashed files may change with any deploy.
+REVALIDATE = 'public, max-age=%d' % 3600
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+CHUNK_SIZE = 64 * 1024
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def file_iterator(f, chunk_size=CHUNK_SIZE):
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+class StaticFilesHandler(object):
+    """
+    Serves the collected files in STATIC_ROOT under STATIC_URL in front of
+    ``application``, with the precompressed variant the client accepts and
+    far-future caching for fingerprinted names.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.abspath(root or settings.STATIC_ROOT)
+        self.prefix = prefix or settings.STATIC_URL
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix) or environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        return self.serve(path[len(self.prefix):], environ, start_response)
+
+    def resolve(self, name):
+        filename = os.path.abspath(os.path.join(self.root, *name.split('/')))
+        if not filename.startswith(self.root + os.sep) or not os.path.isfile(filename):
+            return None
+        return filename
+
+    def not_found(self, start_response):
+        start_response('404 Not Found', [('Content-Type', 'text/plain')])
+        return [b'Not Found']
+
+    def serve(self, name, environ, start_response):
+        filename = None if '\x00' in name else self.resolve(name)
+        if filename is None:
+            return self.not_found(start_response)
+
+        content_type, _ = mimetypes.guess_type(filename)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', IMMUTABLE if HASHED_NAME.search(name) else REVALIDATE),
+        ]
+        # The same for every encoding, so caches can revalidate any of them.
+        mtime = int(os.stat(filename).st_mtime)
+
+        variants = [(coding, filename + suffix) for coding, suffix in ENCODINGS
+                    if os.path.isfile(filename + suffix)]
+        if variants:
+            headers.append(('Vary', 'Accept-Encoding'))
+            accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            for coding, variant in variants:
+                if coding in accepted:
+                    headers.append(('Content-Encoding', coding))
+                    filename = variant
+                    break
+
+        headers.append(('Last-Modified', formatdate(mtime, usegmt=True)))
+        since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if since:
+            parsed = parsedate_tz(since.split(';')[0])
+            if parsed is not None and mtime <= mktime_tz(parsed):
+                start_response('304 Not Modified', [h for h in headers if h[0] != 'Content-Type'])
+                return []
+
+        headers.append(('Content-Length', str(os.path.getsize(filename))))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        f = open(filename, 'rb')
+        wrapper = environ.get('wsgi.file_wrapper')
+        if wrapper is not None:
+            return wrapper(f, CHUNK_SIZE)
+        return file_iterator(f)
@@ -1,5 +1,10 @@
 from django.conf.urls import patterns, include, url
 from django.contrib import admin
+from django.contrib.flatpages.views import flatpage
+from django.views.decorators.gzip import gzip_page
+
+from blogengine.cache import FLATPAGE_GROUP, cache_page_group
+from blogengine.views import performance_stats
 
 admin.autodiscover()
 
@@ -8,7 +13,8 @@ urlpatterns = patterns('',
     # url(r'^$', 'tomblog.views.home', name='home'),
     # url(r'^blog/', include('blog.urls')),
 
+    url(r'^admin/performance/$', performance_stats),
     url(r'^admin/', include(admin.site.urls)),
     url(r'', include('blogengine.urls')),
-    url(r'', include('django.contrib.flatpages.urls')),
+    url(r'^(?P<url>.*)$', gzip_page(cache_page_group(FLATPAGE_GROUP)(flatpage))),
 )
@@ -11,4 +11,5 @@ import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tomblog.settings")
 
 from django.core.wsgi import get_wsgi_application
-application = get_wsgi_application()
+from blogengine.wsgi import StaticFilesHandler
+application = StaticFilesHandler(get_wsgi_application())